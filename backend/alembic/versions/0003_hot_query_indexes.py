@@ -0,0 +1,45 @@
+"""add indexes for hot queries and a unique wordcard index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-08-04 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 字段, 是否唯一)
+INDEXES = [
+    ("ix_character_tags_character_id", "character_tags", ["character_id"], False),
+    ("ix_conversations_user_id_updated_at", "conversations", ["user_id", "updated_at"], False),
+    ("ix_conversations_character_id", "conversations", ["character_id"], False),
+    ("ix_messages_conversation_id_timestamp", "messages", ["conversation_id", "timestamp"], False),
+    ("uq_wordcards_user_id_word", "wordcards", ["user_id", "word"], True),
+    ("ix_predefined_topics_category_id", "predefined_topics", ["category_id"], False),
+]
+
+
+def upgrade() -> None:
+    # 删除同一用户重复收藏的单词（每组保留一条），以便创建唯一索引
+    op.execute(
+        "DELETE FROM wordcards WHERE id NOT IN "
+        "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM wordcards GROUP BY user_id, word) AS keep)"
+    )
+
+    # 由旧版 create_all 建立的数据库可能已经有这些索引
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, unique in INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
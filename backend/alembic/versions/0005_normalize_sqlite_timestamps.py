@@ -0,0 +1,51 @@
+"""normalize SQLite timestamps to one sortable format
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-08-18 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# 需要统一格式的时间字段 (表名, 字段)
+COLUMNS = [
+    ("users", "created_at"),
+    ("users", "updated_at"),
+    ("characters", "created_at"),
+    ("characters", "updated_at"),
+    ("conversations", "created_at"),
+    ("conversations", "updated_at"),
+    ("messages", "timestamp"),
+    ("wordcards", "created_at"),
+]
+
+
+def upgrade() -> None:
+    # 之前由数据库 CURRENT_TIMESTAMP 生成的时间没有小数部分（'YYYY-MM-DD HH:MM:SS'），
+    # 与应用写入的 'YYYY-MM-DD HH:MM:SS.ffffff' 按字符串比较时顺序错误。
+    # 补上微秒部分；同一秒内的多行按写入顺序（rowid）依次加 1 微秒，保留原来的先后顺序。
+    # 其他数据库使用真正的时间类型，不需要处理。
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table, column in COLUMNS:
+        op.execute(
+            f"""
+            UPDATE {table} SET {column} = {column} || '.' || printf('%06d', ranked.n)
+            FROM (
+                SELECT rowid AS rid, row_number() OVER (PARTITION BY {column} ORDER BY rowid) - 1 AS n
+                FROM {table} WHERE length({column}) = 19
+            ) AS ranked
+            WHERE {table}.rowid = ranked.rid
+            """
+        )
+
+
+def downgrade() -> None:
+    # 补上的微秒部分不影响旧版本读取，无需还原
+    pass
@@ -1,170 +1,351 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
-from typing import Any, List, Dict
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Dict, AsyncIterator
+import asyncio
 import os
-from fastapi.responses import FileResponse
+import json
+import logging
+from fastapi.responses import FileResponse, StreamingResponse
 from datetime import datetime
 from pydantic import BaseModel
 
-from app.db.session import get_db
-from app.models.models import Message, Conversation, Character
+from app.core.config import settings
+from app.db.session import get_async_db, AsyncSessionLocal
+from app.models.models import Message, Conversation
 from app.schemas.ai import AiOptionsRequest, AiResponseRequest, AiOptionsResponse
-from app.services.ai_service import get_ai_options, get_ai_response, generate_conversation_title
-from app.services.tts_service import tts_service
+from app.services.ai_service import (
+    cache_options,
+    get_ai_options_async,
+    get_ai_reply_with_options_async,
+    get_ai_response_async,
+    get_ai_response_stream,
+    llm_single_flight,
+    response_cache,
+)
+from app.services.catalog_service import get_character_profile
+from app.services.context_service import load_context_history, remember_new_messages, count_messages
+from app.services.conversation_meta_service import conversation_meta_service
+from app.services.llm_gateway import LLMError, llm_gateway
+from app.services.prompt_cache import prompt_cache
+from app.services.tts_service import tts_service, tts_prefetcher, DEFAULT_VOICE, DEFAULT_RATE, DEFAULT_VOLUME
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 class TTSRequest(BaseModel):
     text: str
-    voice: str = "zh-CN-XiaoxiaoNeural"  # 默认中文女声
-    rate: str = "+0%"  # 默认语速
-    volume: str = "+0%"  # 默认音量
+    voice: str = DEFAULT_VOICE  # 默认中文女声
+    rate: str = DEFAULT_RATE  # 默认语速
+    volume: str = DEFAULT_VOLUME  # 默认音量
 
 @router.post("/get-ai-options", response_model=AiOptionsResponse)
-def fetch_ai_options(request: AiOptionsRequest, db: Session = Depends(get_db)) -> Any:
+async def fetch_ai_options(request: AiOptionsRequest, db: AsyncSession = Depends(get_async_db)) -> Any:
     """获取AI推荐问题"""
     # 检查对话是否存在
-    conversation = db.query(Conversation).filter(Conversation.id == request.conversation_id).first()
+    conversation = await db.get(Conversation, request.conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在",
         )
     
-    # 获取对话的所有消息
-    messages = db.query(Message).filter(Message.conversation_id == request.conversation_id).order_by(Message.timestamp).all()
-    
-    # 获取角色信息
-    character = db.query(Character).filter(Character.id == conversation.character_id).first()
+    # 获取角色信息（带缓存，不查询数据库）
+    character = await get_character_profile(conversation.character_id)
     if not character:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="角色不存在",
         )
     
+    # 获取构建上下文所需的最近消息（优先使用提示词缓存）
+    messages = await load_context_history(db, conversation, character)
+    
     # 调用AI服务获取推荐问题
-    options = get_ai_options(messages, character, conversation.topic)
+    options = await get_ai_options_async(messages, character, conversation.topic, conversation.summary)
     
     return AiOptionsResponse(options=options)
 
 @router.post("/response", response_model=Dict[str, Any])
-def fetch_ai_response(request: AiResponseRequest, db: Session = Depends(get_db)) -> Any:
+async def fetch_ai_response(request: AiResponseRequest, db: AsyncSession = Depends(get_async_db)) -> Any:
     """获取AI回复"""
     try:
         # 检查对话是否存在
-        conversation = db.query(Conversation).filter(Conversation.id == request.conversation_id).first()
+        conversation = await db.get(Conversation, request.conversation_id)
         if not conversation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"对话不存在 (ID: {request.conversation_id})",
             )
         
-        # 获取对话的所有消息
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id  # 使用数据库对象的ID
-        ).order_by(Message.timestamp).all()
-        
-        # 获取角色信息
-        character = db.query(Character).filter(Character.id == conversation.character_id).first()
+        # 获取角色信息（带缓存，不查询数据库）
+        character = await get_character_profile(conversation.character_id)
         if not character:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="角色不存在",
             )
         
-        # 保存用户消息
+        # 获取构建上下文所需的最近消息（优先使用提示词缓存）
+        messages = await load_context_history(db, conversation, character)
+        
+        # 结束读事务并归还连接：调用模型期间不占用数据库连接，也不持有 SQLite 的写锁
+        await db.commit()
+        
+        # 用户消息在模型返回后才写入，这里只用于构建提示词
         user_message = Message(
             content=request.message,
             is_user=True,
             conversation_id=conversation.id,  # 使用数据库对象的ID
         )
-        db.add(user_message)
-        db.flush()
-        db.refresh(user_message)
         
-        # 调用AI服务获取回复
-        ai_content = get_ai_response(messages + [user_message], character, conversation.topic)
+        # 调用AI服务获取回复（合并模式下同一次调用同时生成推荐问题）
+        history = messages.extended([user_message], character.name)
+        if settings.AI_COMBINED_OPTIONS_ENABLED:
+            ai_content, options = await get_ai_reply_with_options_async(history, character, conversation.topic, conversation.summary)
+        else:
+            ai_content, options = await get_ai_response_async(history, character, conversation.topic, conversation.summary), None
         
-        # 保存AI回复
+        # 在一个短事务中保存用户消息和AI回复（按写入顺序排列）
         ai_message = Message(
             content=ai_content,
             is_user=False,
             conversation_id=conversation.id,  # 使用数据库对象的ID
         )
+        db.add(user_message)
         db.add(ai_message)
-        db.flush()
-        db.refresh(ai_message)
-        
-        # 更新对话标题
-        all_messages = messages + [user_message, ai_message]
-        
-        if len(all_messages) > 1:
-            new_title = generate_conversation_title(all_messages, character, conversation.topic)
-            conversation.title = new_title
+        await db.flush()
+        await db.refresh(user_message)
+        await db.refresh(ai_message)
         
         # 更新对话的更新时间
         conversation.updated_at = ai_message.timestamp or datetime.utcnow()
-        db.commit()
+        await db.commit()
+        
+        # 标题和摘要交给后台任务生成，前端在下次获取对话时拿到新标题
+        conversation_meta_service.schedule(conversation.id, await count_messages(db, conversation.id))
+        
+        # 把本轮消息追加到提示词缓存
+        remember_new_messages(conversation.id, [user_message, ai_message])
         
-        # 确保获取最新状态
-        db.refresh(conversation)
-        db.refresh(ai_message)
+        # 缓存推荐问题，随后的 get-ai-options 请求直接命中，不再调用模型
+        if options:
+            await cache_options(ai_message.id, options)
+        
+        # 在后台预合成AI回复的语音（前端播放时使用默认语音）
+        tts_prefetcher.submit(ai_message.content)
         
         return {
             "id": str(ai_message.id),
             "content": ai_message.content,
             "isUser": ai_message.is_user,
             "timestamp": ai_message.timestamp.isoformat() if ai_message.timestamp else None,
-            "conversationTitle": conversation.title
+            "conversationTitle": conversation.title,
+            "options": options or [],
         }
         
     except HTTPException:
         raise
+    except LLMError as e:
+        # 模型不可用时不保存任何消息（包括用户消息），由前端提示重试
+        logger.warning(f"生成AI回复失败: {e}")
+        await db.rollback()
+        prompt_cache.invalidate(request.conversation_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI服务暂时不可用，请稍后再试",
+        )
+    except OperationalError as e:
+        # 数据库繁忙（例如 SQLite 等待写锁超时），没有保存任何消息，可以重试
+        logger.warning(f"保存AI回复失败: {e}")
+        await db.rollback()
+        prompt_cache.invalidate(request.conversation_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后再试",
+        )
     except Exception as e:
-        print(f"Error in fetch_ai_response: {str(e)}")  # 添加日志
-        db.rollback()  # 发生错误时回滚
+        logger.exception(f"处理AI回复请求失败: {e}")
+        await db.rollback()  # 发生错误时回滚
+        prompt_cache.invalidate(request.conversation_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="处理请求时发生错误"
         )
 
-@router.post("/tts", response_class=FileResponse)
-def text_to_speech(request: TTSRequest) -> Any:
-    """将文本转换为语音"""
-    try:
-        # 创建音频文件目录
-        audio_dir = os.path.join(os.getcwd(), "audio_files")
-        os.makedirs(audio_dir, exist_ok=True)
-        
-        # 生成唯一的文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = os.path.join(audio_dir, f"tts_{timestamp}.wav")
-        
-        # 设置TTS参数
-        tts_service.set_voice(request.voice)
-        tts_service.set_rate(request.rate)
-        tts_service.set_volume(request.volume)
-        
-        # 转换文本为语音
-        audio_file = tts_service.text_to_speech(request.text, output_file)
-        if not audio_file:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="语音生成失败",
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """格式化为SSE事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _save_streamed_reply(conversation_id: str, user_content: str, content: str) -> Dict[str, Any]:
+    """在一个事务中保存用户消息和流式生成的AI消息并更新对话，返回与 /response 相同的结构"""
+    # 请求级的数据库会话在流开始前就已关闭，这里使用独立会话保存结果
+    async with AsyncSessionLocal() as db:
+        try:
+            conversation = await db.get(Conversation, conversation_id)
+            
+            # 保存用户消息和AI回复（按写入顺序排列）
+            user_message = Message(
+                content=user_content,
+                is_user=True,
+                conversation_id=conversation_id,
+            )
+            ai_message = Message(
+                content=content,
+                is_user=False,
+                conversation_id=conversation_id,
             )
+            db.add(user_message)
+            db.add(ai_message)
+            await db.flush()
+            await db.refresh(user_message)
+            await db.refresh(ai_message)
+            
+            # 更新对话的更新时间
+            conversation.updated_at = ai_message.timestamp or datetime.utcnow()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
         
-        # 返回音频文件
-        return FileResponse(
-            audio_file,
-            media_type="audio/wav",
-            filename=os.path.basename(audio_file)
-        )
+        # 标题和摘要交给后台任务生成
+        conversation_meta_service.schedule(conversation_id, await count_messages(db, conversation_id))
+        remember_new_messages(conversation_id, [user_message, ai_message])
+        
+        return {
+            "id": str(ai_message.id),
+            "content": ai_message.content,
+            "isUser": ai_message.is_user,
+            "timestamp": ai_message.timestamp.isoformat() if ai_message.timestamp else None,
+            "conversationTitle": conversation.title
+        }
+
+async def _stream_ai_reply(conversation_id: str, user_content: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    逐段推送AI回复，完整生成后再保存本轮的用户消息和AI消息
+
+    模型调用失败、保存失败或客户端中途断开时都不保存任何消息，对话中不会留下没有回复的用户消息。
+    """
+    content_parts = []
+    try:
+        try:
+            async for chunk in chunks:
+                content_parts.append(chunk)
+                yield _format_sse("delta", {"content": chunk})
+        except LLMError as e:
+            logger.warning(f"流式生成AI回复失败: {e}")
+            yield _format_sse("error", {"detail": "AI服务暂时不可用，请稍后再试", "retryable": True})
+            return
         
+        try:
+            # 回复已完整生成：保存不随客户端断开而取消，避免只写入一半
+            result = await asyncio.shield(_save_streamed_reply(conversation_id, user_content, "".join(content_parts)))
+            tts_prefetcher.submit(result["content"])
+            yield _format_sse("done", result)
+        except OperationalError as e:
+            logger.warning(f"保存流式AI回复失败: {e}")
+            yield _format_sse("error", {"detail": "服务繁忙，请稍后再试", "retryable": True})
+        except Exception as e:
+            logger.exception(f"保存流式AI回复失败: {e}")
+            yield _format_sse("error", {"detail": "处理请求时发生错误", "retryable": False})
+    finally:
+        # 客户端中途断开（GeneratorExit / CancelledError）时及时结束模型调用，释放并发名额
+        await chunks.aclose()
+
+@router.post("/response/stream")
+async def stream_ai_response(request: AiResponseRequest, db: AsyncSession = Depends(get_async_db)) -> Any:
+    """以SSE流式获取AI回复
+
+    事件格式：
+        - delta: {"content": string}，增量文本
+        - done: 与 /response 相同的结构，本轮的用户消息和AI消息已保存
+        - error: {"detail": string, "retryable": bool}，本轮的消息都不会保存，retryable 为 true 时可以重新发送
+    """
+    # 检查对话是否存在
+    conversation = await db.get(Conversation, request.conversation_id)
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"对话不存在 (ID: {request.conversation_id})",
+        )
+    
+    # 获取角色信息（带缓存，不查询数据库）
+    character = await get_character_profile(conversation.character_id)
+    if not character:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="角色不存在",
+        )
+    
+    # 获取构建上下文所需的最近消息（优先使用提示词缓存）
+    messages = await load_context_history(db, conversation, character)
+    
+    # 结束读事务；用户消息在回复完整生成后与AI消息一起写入，这里只用于构建提示词
+    await db.commit()
+    user_message = Message(
+        content=request.message,
+        is_user=True,
+        conversation_id=conversation.id,
+    )
+    
+    chunks = get_ai_response_stream(messages.extended([user_message], character.name), character, conversation.topic, conversation.summary)
+    
+    return StreamingResponse(
+        _stream_ai_reply(conversation.id, request.message, chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _prepend_chunk(first_chunk: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """先发送已取到的第一块音频，再发送剩余部分"""
+    try:
+        yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        # 客户端提前断开时及时结束合成，释放并发名额
+        await chunks.aclose()
+
+@router.post("/tts")
+async def text_to_speech(request: TTSRequest) -> Any:
+    """将文本转换为语音
+
+    相同参数的语音直接从缓存返回；未命中时以流的形式边合成边返回（mp3）。
+    """
+    # 命中缓存直接返回文件
+    cached_file = await tts_service.cached_file(request.text, request.voice, request.rate, request.volume)
+    if cached_file:
+        return FileResponse(cached_file, media_type="audio/mpeg", filename=os.path.basename(cached_file))
+    
+    # 先取到第一块音频再开始响应，合成失败时还能返回错误状态码
+    chunks = tts_service.stream(request.text, request.voice, request.rate, request.volume)
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="语音生成失败",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"语音生成失败: {str(e)}",
         )
+    
+    return StreamingResponse(
+        _prepend_chunk(first_chunk, chunks),
+        media_type="audio/mpeg",
+    )
+
+@router.get("/cache-stats")
+def get_cache_stats() -> Dict[str, Any]:
+    """获取AI结果缓存的命中统计，以及模型请求的合并统计（singleFlight）和各模型的熔断状态（circuitBreakers）"""
+    return {
+        **response_cache.stats.snapshot(),
+        "singleFlight": llm_single_flight.snapshot(),
+        "circuitBreakers": llm_gateway.snapshot(),
+    }
 
 @router.get("/voices")
 def get_available_voices() -> List[dict]:
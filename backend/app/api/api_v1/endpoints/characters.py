@@ -1,37 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Any, List
 
-from app.db.session import get_db
+from app.api.deps import get_current_principal
+from app.api.http_cache import json_response
+from app.db.session import get_async_db, get_async_read_db
 from app.models.models import Character, CharacterTag, Conversation
 from app.schemas.character import CharacterCreate, CharacterResponse, CharacterWithTags
+from app.services.auth_service import Principal
+from app.services.catalog_service import get_character_json, get_default_characters_json, invalidate_character
 
 router = APIRouter()
 
 @router.get("/default", response_model=List[CharacterWithTags])
-def get_default_characters(db: Session = Depends(get_db)) -> Any:
-    """获取所有默认角色"""
-    characters = db.query(Character).filter(Character.is_default == True).all()
-    
-    result = []
-    for character in characters:
-        # 获取角色的标签
-        tags = [tag.tag for tag in character.tags]
-        
-        # 构建响应
-        result.append(CharacterWithTags(
-            id=character.id,
-            name=character.name,
-            description=character.description,
-            avatar=character.avatar_url,
-            isDefault=character.is_default,
-            tags=tags,
-        ))
-    
-    return result
+async def get_default_characters(request: Request) -> Any:
+    """获取所有默认角色（返回缓存中已序列化的响应，不查询数据库；客户端版本未变时返回304）"""
+    cached = await get_default_characters_json()
+    return json_response(request, cached.content, cached.etag)
 
 @router.get("/users/{user_id}", response_model=List[CharacterWithTags])
-def get_user_characters(user_id: str, db: Session = Depends(get_db)) -> Any:
+async def get_user_characters(user_id: str, db: AsyncSession = Depends(get_async_read_db)) -> Any:
     """获取指定用户创建的角色列表
     
     参数:
@@ -48,10 +38,12 @@ def get_user_characters(user_id: str, db: Session = Depends(get_db)) -> Any:
     }]
     """
     # 获取用户创建的所有角色
-    characters = db.query(Character).filter(
-        Character.created_by == user_id,
-        Character.is_default == False  # 只获取用户创建的非默认角色
-    ).all()
+    characters = (await db.execute(
+        select(Character).options(selectinload(Character.tags)).where(
+            Character.created_by == user_id,
+            Character.is_default == False  # 只获取用户创建的非默认角色
+        )
+    )).scalars().all()
     
     result = []
     for character in characters:
@@ -71,30 +63,19 @@ def get_user_characters(user_id: str, db: Session = Depends(get_db)) -> Any:
     return result
 
 @router.get("/{character_id}", response_model=CharacterWithTags)
-def get_character(character_id: str, db: Session = Depends(get_db)) -> Any:
-    """获取单个角色"""
-    character = db.query(Character).filter(Character.id == character_id).first()
-    if not character:
+async def get_character(character_id: str, request: Request) -> Any:
+    """获取单个角色（返回缓存中已序列化的响应；客户端版本未变时返回304）"""
+    cached = await get_character_json(character_id)
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="角色不存在",
         )
     
-    # 获取角色的标签
-    tags = [tag.tag for tag in character.tags]
-    
-    # 构建响应
-    return CharacterWithTags(
-        id=character.id,
-        name=character.name,
-        description=character.description,
-        avatar=character.avatar_url,
-        isDefault=character.is_default,
-        tags=tags,
-    )
+    return json_response(request, cached.content, cached.etag)
 
 @router.post("/create", response_model=CharacterResponse)
-def create_character(character_in: CharacterCreate, user_id: str, db: Session = Depends(get_db)) -> Any:
+async def create_character(character_in: CharacterCreate, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)) -> Any:
     """创建新角色"""
     # 创建角色
     character = Character(
@@ -102,10 +83,10 @@ def create_character(character_in: CharacterCreate, user_id: str, db: Session =
         description=character_in.description,
         avatar_url=character_in.avatar,
         is_default=False,
-        created_by=user_id,
+        created_by=principal.user_id,
     )
     db.add(character)
-    db.flush()  # 获取ID
+    await db.flush()  # 获取ID
     
     # 添加标签
     if character_in.tags:
@@ -113,8 +94,11 @@ def create_character(character_in: CharacterCreate, user_id: str, db: Session =
             char_tag = CharacterTag(character_id=character.id, tag=tag)
             db.add(char_tag)
     
-    db.commit()
-    db.refresh(character)
+    await db.commit()
+    await db.refresh(character)
+    
+    # 使角色相关的缓存失效
+    invalidate_character(character.id)
     
     return CharacterResponse(
         id=character.id,
@@ -125,10 +109,10 @@ def create_character(character_in: CharacterCreate, user_id: str, db: Session =
     )
 
 @router.get("/sessions/{character_id}", response_model=List[dict])
-def get_character_sessions(character_id: str, user_id: str, db: Session = Depends(get_db)) -> Any:
+async def get_character_sessions(character_id: str, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_read_db)) -> Any:
     """获取角色的所有对话"""
     # 检查角色是否存在
-    character = db.query(Character).filter(Character.id == character_id).first()
+    character = await db.get(Character, character_id)
     if not character:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -136,10 +120,12 @@ def get_character_sessions(character_id: str, user_id: str, db: Session = Depend
         )
     
     # 获取该角色与用户的所有对话
-    conversations = db.query(Conversation).filter(
-        Conversation.character_id == character_id,
-        Conversation.user_id == user_id,
-    ).all()
+    conversations = (await db.execute(
+        select(Conversation).where(
+            Conversation.character_id == character_id,
+            Conversation.user_id == principal.user_id,
+        )
+    )).scalars().all()
     
     # 构建响应
     result = []
@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import Any, List
 
-from app.db.session import get_db
-from app.models.models import Conversation, Message, Character, User
+from app.api.deps import get_current_principal, get_path_user_principal
+from app.api.http_cache import PRIVATE_CACHE_CONTROL, conditional_response, make_etag, set_cache_headers
+from app.api.pagination import CursorParams, cursor_params, list_response, paginate, set_cursor_headers
+from app.db.session import get_async_db, get_async_read_db
+from app.models.models import Conversation, Message, generate_uuid
 from app.schemas.conversation import ConversationCreate, ConversationResponse, ConversationWithMessages
-from app.services.ai_service import get_ai_response
+from app.services.ai_service import get_ai_response_async
+from app.services.auth_service import Principal
+from app.services.catalog_service import get_character_profile
+from app.services.context_service import message_list_version
+from app.services.llm_gateway import LLMError
+from app.services.tts_service import tts_prefetcher
 
 router = APIRouter()
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
-def get_conversation(conversation_id: str, db: Session = Depends(get_db)) -> Any:
+async def get_conversation(conversation_id: str, db: AsyncSession = Depends(get_async_db)) -> Any:
     """获取单个对话（不包含消息）"""
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -31,16 +42,41 @@ def get_conversation(conversation_id: str, db: Session = Depends(get_db)) -> Any
     }
 
 @router.get("/{conversation_id}/messages", response_model=List[dict])
-def get_conversation_messages(conversation_id: str, db: Session = Depends(get_db)) -> Any:
-    """获取对话的所有消息"""
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+async def get_conversation_messages(
+    conversation_id: str,
+    request: Request,
+    response: Response,
+    params: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+) -> Any:
+    """
+    获取对话的消息（按时间升序）
+
+    传入 limit 时分页返回，不带游标时返回最新的一页；
+    更早一页的游标在响应头 X-Prev-Cursor 中，更新一页的在 X-Next-Cursor 中。
+    客户端携带的 If-None-Match 与当前版本一致时直接返回304，不加载消息。
+    """
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在",
         )
+
+    # 用消息数和最后一条消息的时间作为版本，加上分页参数生成 ETag
+    etag = make_etag("messages", conversation_id, *await message_list_version(db, conversation_id), *params)
+    not_modified = conditional_response(request, etag, PRIVATE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    set_cache_headers(response, etag, PRIVATE_CACHE_CONTROL)
     
-    messages = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp).all()
+    stmt = select(Message).where(Message.conversation_id == conversation_id)
+    if params.limit is None:
+        messages = (await db.execute(stmt.order_by(Message.timestamp, Message.id))).scalars().all()
+    else:
+        page = await paginate(db, stmt, Message.timestamp, Message.id, params, from_end=True)
+        set_cursor_headers(response, page)
+        messages = page.items
     
     result = []
     for msg in messages:
@@ -52,47 +88,60 @@ def get_conversation_messages(conversation_id: str, db: Session = Depends(get_db
             "timestamp": msg.timestamp.isoformat(),
         })
     
-    return result
+    return list_response(result, response)
 
 @router.post("/", response_model=ConversationResponse)
-def create_conversation(conversation_in: ConversationCreate, user_id: str, db: Session = Depends(get_db)) -> Any:
+async def create_conversation(conversation_in: ConversationCreate, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)) -> Any:
     """创建新对话并返回AI的第一条回复"""
     # 检查角色是否存在
-    character = db.query(Character).filter(Character.id == conversation_in.character_id).first()
+    character = await get_character_profile(conversation_in.character_id)
     if not character:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="角色不存在",
         )
     
-    # 创建对话
+    # 先调用AI服务生成开场白（传入空的消息列表），调用期间不打开写事务
+    try:
+        ai_content = await get_ai_response_async([], character, conversation_in.topic)
+    except LLMError:
+        # 模型不可用时不创建对话
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI服务暂时不可用，请稍后再试",
+        )
+    
+    # 在一个短事务中创建对话和AI的第一条消息
     conversation = Conversation(
+        id=generate_uuid(),
         title=f"与{character.name}的对话",
         topic=conversation_in.topic,
-        user_id=user_id,
+        user_id=principal.user_id,
         character_id=conversation_in.character_id,
     )
-    db.add(conversation)
-    db.flush()  # 获取ID
-    
-    # 调用AI服务获取第一条回复
-    # 注意：这里我们传入一个空的消息列表，让AI生成开场白
-    ai_content = get_ai_response([], character, conversation.topic)
-    
-    # 创建AI的回复消息
     ai_message = Message(
         content=ai_content,
         is_user=False,
         conversation_id=conversation.id,
     )
+    db.add(conversation)
     db.add(ai_message)
-    
-    # 确保所有更改都被提交
-    db.commit()
+    try:
+        await db.commit()
+    except OperationalError:
+        # 数据库繁忙（例如 SQLite 等待写锁超时），对话没有创建，可以重试
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后再试",
+        )
     
     # 刷新所有对象以获取最新状态
-    db.refresh(conversation)
-    db.refresh(ai_message)
+    await db.refresh(conversation)
+    await db.refresh(ai_message)
+    
+    # 在后台预合成开场白的语音
+    tts_prefetcher.submit(ai_message.content)
 
     # 返回对话信息
     return {
@@ -107,26 +156,34 @@ def create_conversation(conversation_in: ConversationCreate, user_id: str, db: S
     }
 
 @router.get("/user/{user_id}", response_model=List[dict])
-def get_user_conversations(user_id: str, db: Session = Depends(get_db)) -> Any:
-    """获取用户的所有对话"""
-    # 检查用户是否存在
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="用户不存在",
-        )
-    
-    # 获取用户的所有对话
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == user_id
-    ).order_by(Conversation.updated_at.desc()).all()
+async def get_user_conversations(
+    response: Response,
+    principal: Principal = Depends(get_path_user_principal),
+    params: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Any:
+    """
+    获取用户的对话（按更新时间倒序）
+
+    传入 limit 时分页返回，下一页的游标在响应头 X-Next-Cursor 中。
+    """
+    # 获取用户的所有对话（用户已在身份验证时确认存在），角色信息在同一条查询中连接加载
+    stmt = select(Conversation).options(joinedload(Conversation.character)).where(
+        Conversation.user_id == principal.user_id
+    )
+    if params.limit is None:
+        conversations = (await db.execute(
+            stmt.order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        )).scalars().all()
+    else:
+        page = await paginate(db, stmt, Conversation.updated_at, Conversation.id, params, descending=True)
+        set_cursor_headers(response, page)
+        conversations = page.items
     
     # 构建响应
     result = []
     for conv in conversations:
-        # 获取角色信息
-        character = db.query(Character).filter(Character.id == conv.character_id).first()
+        character = conv.character
         
         result.append({
             "id": str(conv.id),
@@ -142,4 +199,4 @@ def get_user_conversations(user_id: str, db: Session = Depends(get_db)) -> Any:
             } if character else None
         })
     
-    return result
\ No newline at end of file
+    return list_response(result, response)
\ No newline at end of file
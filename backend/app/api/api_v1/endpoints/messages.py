@@ -1,18 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any, Dict
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models.models import Message, Conversation
 from app.schemas.message import MessageCreate, MessageResponse
+from app.services.context_service import remember_new_messages
 
 router = APIRouter()
 
 @router.post("/save", response_model=MessageResponse)
-def save_message(message_in: MessageCreate, db: Session = Depends(get_db)) -> Any:
+async def save_message(message_in: MessageCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     """保存用户消息"""
     # 检查对话是否存在
-    conversation = db.query(Conversation).filter(Conversation.id == message_in.conversation_id).first()
+    conversation = await db.get(Conversation, message_in.conversation_id)
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -26,12 +27,15 @@ def save_message(message_in: MessageCreate, db: Session = Depends(get_db)) -> An
         conversation_id=message_in.conversation_id,
     )
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
     
     # 更新对话的更新时间
     conversation.updated_at = message.timestamp
-    db.commit()
+    await db.commit()
+    
+    # 追加到提示词缓存
+    remember_new_messages(message_in.conversation_id, [message])
     
     return MessageResponse(
         id=message.id,
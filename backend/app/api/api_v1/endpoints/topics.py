@@ -1,42 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Any, List, Dict
+from fastapi import APIRouter, Request
+from typing import Any, List
 
-from app.db.session import get_db
-from app.models.models import TopicCategory, PredefinedTopic
-from app.schemas.topic import TopicCategoryResponse, TopicResponse, TopicGenerateRequest
-from app.services.ai_service import generate_topics
+from app.api.http_cache import json_response
+from app.schemas.topic import TopicCategoryResponse, TopicGenerateRequest
+from app.services.ai_service import generate_topics_async
+from app.services.catalog_service import get_predefined_topics_json
 
 router = APIRouter()
 
 @router.get("/", response_model=List[TopicCategoryResponse])
-def get_predefined_topics(db: Session = Depends(get_db)) -> Any:
-    """获取预定义话题"""
-    categories = db.query(TopicCategory).all()
-    
-    result = []
-    for category in categories:
-        topics = db.query(PredefinedTopic).filter(PredefinedTopic.category_id == category.id).all()
-        
-        topic_list = []
-        for topic in topics:
-            topic_list.append(TopicResponse(
-                id=topic.id,
-                title=topic.content,
-            ))
-        
-        result.append(TopicCategoryResponse(
-            id=category.id,
-            name=category.name,
-            topics=topic_list,
-        ))
-    
-    return result
+async def get_predefined_topics(request: Request) -> Any:
+    """获取预定义话题（返回缓存中已序列化的响应，不查询数据库；客户端版本未变时返回304）"""
+    cached = await get_predefined_topics_json()
+    return json_response(request, cached.content, cached.etag)
 
 @router.post("/generate", response_model=List[str])
-def generate_custom_topics(request: TopicGenerateRequest) -> Any:
+async def generate_custom_topics(request: TopicGenerateRequest) -> Any:
     """根据提示生成话题"""
     # 调用AI服务生成话题
-    topics = generate_topics(request.prompt, request.num_topics)
+    topics = await generate_topics_async(request.prompt, request.num_topics)
     
     return topics
\ No newline at end of file
@@ -1,20 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any
 
-from app.core.security import verify_password, get_password_hash
-from app.db.session import get_db
+from app.api.deps import get_current_principal
+from app.core.config import settings
+from app.core.security import dummy_verify_password_async, get_password_hash_async, verify_and_update_password_async
+from app.db.session import get_async_db
 from app.models.models import User
 from app.schemas.user import UserCreate, UserResponse
+from app.services.auth_service import Principal, issue_access_token
+from app.services.rate_limiter import login_ip_limiter, login_user_limiter
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def register_user(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     """注册新用户"""
     # 检查用户名是否已存在
-    user = db.query(User).filter(User.username == user_in.username).first()
+    user = (await db.execute(select(User.id).where(User.username == user_in.username))).scalar()
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -23,22 +31,29 @@ def register_user(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
     
     # 检查邮箱是否已存在
     if user_in.email:
-        user = db.query(User).filter(User.email == user_in.email).first()
+        user = (await db.execute(select(User.id).where(User.email == user_in.email))).scalar()
         if user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="邮箱已存在",
             )
     
-    # 创建新用户
+    # 创建新用户（密码在专用线程池中哈希）
     user = User(
         username=user_in.username,
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await get_password_hash_async(user_in.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 并发注册了相同的用户名或邮箱
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="用户名或邮箱已存在",
+        )
     
     return UserResponse(
         id=user.id,
@@ -47,28 +62,53 @@ def register_user(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
     )
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Any:
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)) -> Any:
     """用户登录
     接收 application/x-www-form-urlencoded 格式的请求
     参数:
         - username: 用户名
         - password: 密码
     """
+    # 按用户名和IP限流，超过限制时不再进行密码验证
+    client_ip = request.client.host if request.client else "unknown"
+    for limiter, key in ((login_user_limiter, form_data.username), (login_ip_limiter, client_ip)):
+        retry_after = limiter.hit(key)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="登录尝试过于频繁，请稍后再试",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
     # 查找用户
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (await db.execute(select(User).where(User.username == form_data.username))).scalar()
+    if user:
+        verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    else:
+        # 同样付出一次 bcrypt 验证的时间，避免通过响应时间判断用户名是否存在
+        await dummy_verify_password_async()
+        verified, new_hash = False, None
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
         )
+
+    # bcrypt 成本改变后，用新的成本重新保存密码哈希（updated_at 保持列的当前值，不触发onupdate）
+    if new_hash:
+        await db.execute(
+            update(User).where(User.id == user.id).values(hashed_password=new_hash, updated_at=User.updated_at)
+        )
+        await db.commit()
     
-    # 生成简单的访问令牌（在实际应用中应该使用 JWT）
-    access_token = f"user_{user.id}"  # 简单的令牌格式
+    # 生成签名的访问令牌（JWT），后续请求通过 Authorization: Bearer <token> 携带
+    access_token = issue_access_token(user)
     
     # 返回符合前端 authService.ts 期望的格式
     return {
         "access_token": access_token,
         "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         "user": {
             "id": str(user.id),
             "username": user.username,
@@ -77,18 +117,10 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     }
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user(user_id: str, db: Session = Depends(get_db)) -> Any:
-    """获取当前用户信息"""
-    # 由于不使用JWT，我们需要前端传递user_id
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="用户不存在",
-        )
-    
+async def get_current_user(principal: Principal = Depends(get_current_principal)) -> Any:
+    """获取当前用户信息（直接取自令牌，不查询数据库）"""
     return UserResponse(
-        id=user.id,
-        username=user.username,
-        email=user.email,
-    )
\ No newline at end of file
+        id=principal.user_id,
+        username=principal.username,
+        email=principal.email,
+    )
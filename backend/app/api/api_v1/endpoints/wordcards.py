@@ -1,49 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any, List
 
-from app.db.session import get_db
+from app.api.deps import get_current_principal
+from app.api.http_cache import PRIVATE_CACHE_CONTROL, conditional_response, make_etag, set_cache_headers
+from app.api.pagination import CursorParams, cursor_params, list_response, paginate, set_cursor_headers
+from app.db.session import get_async_db, get_async_read_db
 from app.models.models import Wordcard
 from app.schemas.wordcard import WordcardCreate, WordcardResponse
+from app.services.auth_service import Principal
 
 router = APIRouter()
 
 @router.get("/check", response_model=bool)
-def check_if_favorited(word: str, user_id: str, db: Session = Depends(get_db)) -> Any:
+async def check_if_favorited(word: str, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_read_db)) -> Any:
     """检查单词是否已收藏"""
-    wordcard = db.query(Wordcard).filter(
-        Wordcard.word == word,
-        Wordcard.user_id == user_id
-    ).first()
+    wordcard = (await db.execute(
+        select(Wordcard.id).where(
+            Wordcard.word == word,
+            Wordcard.user_id == principal.user_id
+        ).limit(1)
+    )).scalar()
     
     return wordcard is not None
 
 @router.post("/add", response_model=WordcardResponse)
-def add_favorite(wordcard_in: WordcardCreate, user_id: str, db: Session = Depends(get_db)) -> Any:
+async def add_favorite(wordcard_in: WordcardCreate, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)) -> Any:
     """添加收藏单词"""
-    # 检查是否已收藏
-    existing = db.query(Wordcard).filter(
-        Wordcard.word == wordcard_in.word,
-        Wordcard.user_id == user_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="单词已收藏",
-        )
-    
-    # 创建单词卡
+    # 创建单词卡；重复收藏由 (user_id, word) 唯一索引拒绝
     wordcard = Wordcard(
         word=wordcard_in.word,
         pronunciation=wordcard_in.pronunciation,
         pos=wordcard_in.pos,
         context=wordcard_in.context,
-        user_id=user_id,
+        user_id=principal.user_id,
     )
     db.add(wordcard)
-    db.commit()
-    db.refresh(wordcard)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="单词已收藏",
+        )
+    await db.refresh(wordcard)
     
     return WordcardResponse(
         id=wordcard.id,
@@ -55,12 +58,14 @@ def add_favorite(wordcard_in: WordcardCreate, user_id: str, db: Session = Depend
     )
 
 @router.post("/remove")
-def remove_favorite(word: str, user_id: str, db: Session = Depends(get_db)) -> Any:
+async def remove_favorite(word: str, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)) -> Any:
     """移除收藏单词"""
-    wordcard = db.query(Wordcard).filter(
-        Wordcard.word == word,
-        Wordcard.user_id == user_id
-    ).first()
+    wordcard = (await db.execute(
+        select(Wordcard).where(
+            Wordcard.word == word,
+            Wordcard.user_id == principal.user_id
+        )
+    )).scalars().first()
     
     if not wordcard:
         raise HTTPException(
@@ -68,25 +73,53 @@ def remove_favorite(word: str, user_id: str, db: Session = Depends(get_db)) -> A
             detail="单词未收藏",
         )
     
-    db.delete(wordcard)
-    db.commit()
+    await db.delete(wordcard)
+    await db.commit()
     
     return {"status": "success"}
 
 @router.get("/list", response_model=List[WordcardResponse])
-def get_favorites(user_id: str, db: Session = Depends(get_db)) -> Any:
-    """获取用户收藏的单词列表"""
-    wordcards = db.query(Wordcard).filter(Wordcard.user_id == user_id).all()
+async def get_favorites(
+    request: Request,
+    response: Response,
+    principal: Principal = Depends(get_current_principal),
+    params: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Any:
+    """
+    获取用户收藏的单词列表
+
+    传入 limit 时按收藏时间倒序分页返回，下一页的游标在响应头 X-Next-Cursor 中。
+    客户端携带的 If-None-Match 与当前版本一致时直接返回304。
+    """
+    # 用收藏数和最近一次收藏的时间作为版本（收藏只增删不修改）
+    count, latest = (await db.execute(
+        select(func.count(Wordcard.id), func.max(Wordcard.created_at)).where(Wordcard.user_id == principal.user_id)
+    )).one()
+    etag = make_etag("favorites", principal.user_id, count, latest, *params)
+    not_modified = conditional_response(request, etag, PRIVATE_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    set_cache_headers(response, etag, PRIVATE_CACHE_CONTROL)
+
+    stmt = select(Wordcard).where(Wordcard.user_id == principal.user_id)
+    if params.limit is None:
+        wordcards = (await db.execute(stmt)).scalars().all()
+    else:
+        page = await paginate(db, stmt, Wordcard.created_at, Wordcard.id, params, descending=True)
+        set_cursor_headers(response, page)
+        wordcards = page.items
     
+    # 直接构建字典，由 orjson 序列化（字段与 WordcardResponse 一致）
     result = []
     for card in wordcards:
-        result.append(WordcardResponse(
-            id=card.id,
-            word=card.word,
-            pronunciation=card.pronunciation,
-            pos=card.pos,
-            context=card.context,
-            created_at=card.created_at,
-        ))
+        result.append({
+            "id": card.id,
+            "word": card.word,
+            "pronunciation": card.pronunciation,
+            "pos": card.pos,
+            "context": card.context,
+            "created_at": card.created_at,
+        })
     
-    return result
\ No newline at end of file
+    return list_response(result, response)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import gzip
+import zlib
+from typing import Optional
+
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.http_cache import client_has_encoded, encoded_etag
+
+# 不压缩的响应类型：SSE 需要逐条推送，音频、图片本身已经压缩
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "audio/", "image/", "video/")
+# 同时支持时优先使用的编码
+PREFERRED_ENCODINGS = ("zstd", "gzip")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding 选择压缩编码，不支持任何编码时返回None"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        # 忽略 q=0（明确拒绝）的编码
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in PREFERRED_ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+class _StreamCompressor:
+    """流式响应的增量压缩器，每个数据块都会刷新，保证客户端能及时收到"""
+
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int):
+        if encoding == "zstd":
+            self._zstd = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._zlib = None
+        else:
+            self._zstd = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._zstd is not None:
+            return self._zstd.compress(data) + self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._zstd is not None:
+            return self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        return self._zlib.flush(zlib.Z_FINISH)
+
+class CompressionMiddleware:
+    """按 Accept-Encoding 使用 zstd 或 gzip 压缩响应
+
+    小于 minimum_size 的完整响应、已经编码的响应以及 SSE、音频等类型原样透传；
+    压缩后的响应 ETag 附加编码名，If-None-Match 比较时会忽略该后缀；
+    304 响应没有响应体，只在客户端缓存的是压缩后的表示时才附加编码名。
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # pending: 等待第一个响应体以决定是否压缩；pass: 原样转发；stream: 增量压缩
+        mode = "pending"
+        start: Optional[Message] = None
+        compressor: Optional[_StreamCompressor] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal mode, start, compressor
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] == 304:
+                    mode = "pass"
+                    await send(_not_modified_start(message, encoding, request_headers.get("if-none-match")))
+                elif not self._compressible(message["status"], headers):
+                    mode = "pass"
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if message["type"] != "http.response.body" or mode == "pass":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if mode == "pending":
+                if not more_body:
+                    # 完整响应：太小时不压缩，否则一次性压缩
+                    mode = "pass"
+                    if len(body) < self.minimum_size:
+                        await send(start)
+                        await send(message)
+                        return
+                    content = self._compress(body, encoding)
+                    await send(_encoded_start(start, encoding, len(content)))
+                    await send({"type": "http.response.body", "body": content})
+                    return
+                mode = "stream"
+                compressor = _StreamCompressor(encoding, self.gzip_level, self.zstd_level)
+                await send(_encoded_start(start, encoding, None))
+
+            content = compressor.compress(body) if body else b""
+            if not more_body:
+                content += compressor.finish()
+            await send({"type": "http.response.body", "body": content, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _compressible(self, status: int, headers: Headers) -> bool:
+        if status < 200 or status in (204, 206) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return not any(content_type.startswith(excluded) for excluded in EXCLUDED_CONTENT_TYPES)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+def _vary_accept_encoding(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = vary + ", Accept-Encoding"
+
+def _encoded_start(start: Message, encoding: str, content_length: Optional[int]) -> Message:
+    """设置压缩后响应的 Content-Encoding、Content-Length 与 ETag"""
+    headers = MutableHeaders(raw=list(start["headers"]))
+    headers["Content-Encoding"] = encoding
+    if content_length is None:
+        del headers["content-length"]
+    else:
+        headers["Content-Length"] = str(content_length)
+    if "etag" in headers:
+        headers["ETag"] = encoded_etag(headers["etag"], encoding)
+    _vary_accept_encoding(headers)
+    return {**start, "headers": headers.raw}
+
+def _not_modified_start(start: Message, encoding: str, if_none_match: Optional[str]) -> Message:
+    """
+    304 响应携带与客户端缓存的200响应相同的 ETag
+
+    小于 minimum_size 的200响应未压缩、ETag 没有编码名；304 无法得知原响应的大小，
+    因此按客户端发送的 If-None-Match 判断它缓存的是哪种表示。
+    """
+    headers = MutableHeaders(raw=list(start["headers"]))
+    if "etag" not in headers:
+        return start
+    if client_has_encoded(if_none_match, headers["etag"], encoding):
+        headers["ETag"] = encoded_etag(headers["etag"], encoding)
+    _vary_accept_encoding(headers)
+    return {**start, "headers": headers.raw}
@@ -0,0 +1,68 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.core.config import settings
+from app.db.session import AsyncReadSessionLocal
+from app.services.auth_service import Principal, resolve_token, resolve_user_id
+
+# 从 Authorization: Bearer <token> 读取令牌；缺少时不自动报错，以便兼容旧客户端
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def authenticate(credentials: Optional[HTTPAuthorizationCredentials], user_id: Optional[str]) -> Principal:
+    """
+    验证当前用户身份
+
+    带令牌的请求只做签名校验（结果有缓存），不查询数据库，传入的 user_id 必须与令牌一致；
+    没有令牌时按配置接受 user_id，解析结果同样会被缓存。
+    """
+    if credentials is not None:
+        principal = resolve_token(credentials.credentials)
+        if principal is None:
+            raise _unauthorized("无效或已过期的令牌")
+        if user_id is not None and user_id != principal.user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="无权访问其他用户的数据",
+            )
+        return principal
+
+    if user_id is None or not settings.AUTH_ALLOW_USER_ID_PARAM:
+        raise _unauthorized("未登录")
+
+    async with AsyncReadSessionLocal() as db:
+        principal = await resolve_user_id(db, user_id)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在",
+        )
+    return principal
+
+async def get_current_principal(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    user_id: Optional[str] = Query(None, description="旧客户端没有令牌时传入的用户ID"),
+) -> Principal:
+    """获取当前用户身份的依赖函数"""
+    return await authenticate(credentials, user_id)
+
+async def get_path_user_principal(
+    user_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Principal:
+    """
+    路径中带有用户ID的接口：该用户必须是当前用户
+
+    路径中的用户ID总是存在，不能当作身份凭证；未开启 AUTH_ALLOW_USER_ID_PARAM 时必须带令牌。
+    """
+    if credentials is None and not settings.AUTH_ALLOW_USER_ID_PARAM:
+        raise _unauthorized("未登录")
+    return await authenticate(credentials, user_id)
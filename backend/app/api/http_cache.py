@@ -0,0 +1,153 @@
+import hashlib
+from typing import Any, List, Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# 公共数据（角色、话题）：客户端可以缓存，但每次使用前需要用 ETag 重新验证
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+# 用户私有数据：只允许浏览器缓存，同样每次重新验证
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+# 压缩后的响应在 ETag 末尾附加编码名，比较时忽略
+ETAG_ENCODING_SUFFIXES = ("-gzip", "-zstd")
+
+def make_etag(*parts: Any) -> str:
+    """由版本信息（如最后一条消息ID、更新时间）或响应内容生成强 ETag"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return '"' + digest.hexdigest()[:32] + '"'
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """压缩后的表示使用不同的 ETag：在引号内附加编码名"""
+    return etag[:-1] + f'-{encoding}"' if etag.endswith('"') else etag
+
+def _strip_encoding(tag: str) -> str:
+    for suffix in ETAG_ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+def _parse_if_none_match(value: str) -> List[str]:
+    # If-None-Match 使用弱比较，忽略 W/ 前缀和压缩编码后缀
+    return [_strip_encoding(tag.strip().removeprefix("W/")) for tag in value.split(",") if tag.strip()]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断客户端缓存的版本是否仍然有效"""
+    if not if_none_match:
+        return False
+    tags = _parse_if_none_match(if_none_match)
+    return "*" in tags or etag in tags
+
+def client_has_encoded(if_none_match: Optional[str], etag: str, encoding: str) -> bool:
+    """判断客户端缓存的是否为该编码压缩后的表示（据此决定304响应的 ETag 是否附加编码名）"""
+    if not if_none_match:
+        return False
+    target = encoded_etag(etag, encoding)
+    return any(tag.strip().removeprefix("W/") == target for tag in if_none_match.split(","))
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def conditional_response(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    """客户端缓存仍然有效时返回304响应，否则返回None"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
+    return None
+
+def set_cache_headers(response: Response, etag: str, cache_control: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+def json_response(request: Request, content: bytes, etag: str, cache_control: str = PUBLIC_CACHE_CONTROL) -> Response:
+    """返回已序列化的JSON；客户端的版本与 etag 一致时返回304"""
+    response = conditional_response(request, etag, cache_control)
+    if response is not None:
+        return response
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+class ETagMiddleware:
+    """为没有设置 ETag 的 GET JSON 响应按内容生成 ETag，并处理 If-None-Match
+
+    只缓冲 application/json 响应，SSE、音频等流式响应原样透传。
+    接口已经自行设置 ETag 时不再计算，仅在客户端版本一致时改为304。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        # pass: 原样转发；buffer: 缓冲响应体后计算 ETag；discard: 已返回304，丢弃响应体
+        mode = "pass"
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal mode, start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] != 200:
+                    await send(message)
+                elif "etag" in headers:
+                    if etag_matches(if_none_match, headers["etag"]):
+                        mode = "discard"
+                        await send(_not_modified_start(message, headers["etag"]))
+                    else:
+                        await send(message)
+                elif headers.get("content-type", "").startswith("application/json"):
+                    mode = "buffer"
+                    start = message
+                else:
+                    await send(message)
+                return
+
+            if message["type"] == "http.response.body" and mode != "pass":
+                if mode == "buffer":
+                    chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                if mode == "buffer":
+                    await _send_with_etag(send, start, b"".join(chunks), if_none_match)
+                else:
+                    await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+def _not_modified_start(start: Message, etag: str) -> Message:
+    """把响应头改为304响应的响应头（去掉与响应体相关的头）"""
+    headers = MutableHeaders(raw=list(start["headers"]))
+    cache_control = headers.get("cache-control", PRIVATE_CACHE_CONTROL)
+    raw = [
+        (key, value) for key, value in headers.raw
+        if key not in (b"content-length", b"content-type", b"etag", b"cache-control")
+    ]
+    raw += [(b"etag", etag.encode("latin-1")), (b"cache-control", cache_control.encode("latin-1"))]
+    return {"type": "http.response.start", "status": 304, "headers": raw}
+
+async def _send_with_etag(send: Send, start: Message, content: bytes, if_none_match: Optional[str]) -> None:
+    etag = make_etag(content)
+    if etag_matches(if_none_match, etag):
+        await send(_not_modified_start(start, etag))
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    headers = MutableHeaders(raw=list(start["headers"]))
+    headers["ETag"] = etag
+    if "cache-control" not in headers:
+        headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+    await send({"type": "http.response.start", "status": 200, "headers": headers.raw})
+    await send({"type": "http.response.body", "body": content})
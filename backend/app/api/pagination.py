@@ -0,0 +1,129 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+class CursorParams(NamedTuple):
+    """分页参数；limit 为 None 时不分页"""
+    limit: Optional[int]
+    before: Optional[str]
+    after: Optional[str]
+
+class CursorPage(NamedTuple):
+    """一页数据以及前后页的游标（没有更多数据时为None）"""
+    items: List[Any]
+    prev_cursor: Optional[str]
+    next_cursor: Optional[str]
+
+def cursor_params(
+    limit: Optional[int] = Query(None, ge=1, description="每页条数，不传时按配置返回全部或默认条数"),
+    before: Optional[str] = Query(None, description="返回此游标之前的数据（上一页）"),
+    after: Optional[str] = Query(None, description="返回此游标之后的数据（下一页）"),
+) -> CursorParams:
+    """游标分页参数的依赖函数"""
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="before 和 after 不能同时使用",
+        )
+    if limit is None and (before is not None or after is not None or not settings.PAGINATION_ALLOW_UNBOUNDED):
+        limit = settings.PAGINATION_DEFAULT_LIMIT
+    if limit is not None:
+        limit = min(limit, settings.PAGINATION_MAX_LIMIT)
+    return CursorParams(limit, before, after)
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """把排序字段和ID编码为不透明的游标"""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析游标，格式不正确时返回400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(sort_value), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标",
+        )
+
+async def paginate(
+    db: AsyncSession,
+    stmt: Select,
+    sort_column,
+    id_column,
+    params: CursorParams,
+    descending: bool = False,
+    from_end: bool = False,
+) -> CursorPage:
+    """
+    按 (sort_column, id_column) 做键集分页
+
+    列表的自然顺序由 descending 决定；before/after 分别取游标之前/之后的一页。
+    都不传时返回第一页，from_end 为True时返回最后一页（例如聊天记录默认显示最新消息）。
+    每页只查询 limit + 1 行，与数据总量无关。
+    排序字段需由应用写入（见 models.utcnow），游标中的值绑定为参数后与存储的值格式一致、可以直接比较。
+    """
+    key = tuple_(sort_column, id_column)
+
+    # 是否沿自然顺序的反方向查询（取游标之前的数据或最后一页）
+    backwards = params.before is not None or (params.after is None and from_end)
+    cursor = params.before if params.before is not None else params.after
+    if cursor is not None:
+        cursor_key = decode_cursor(cursor)
+        # 查询方向为升序时取大于游标的数据，降序时取小于游标的数据
+        ascending = descending == backwards
+        stmt = stmt.where(key > cursor_key if ascending else key < cursor_key)
+
+    if descending == backwards:
+        stmt = stmt.order_by(sort_column, id_column)
+    else:
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+
+    rows = list((await db.execute(stmt.limit(params.limit + 1))).unique().scalars().all())
+    has_more = len(rows) > params.limit
+    rows = rows[:params.limit]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return CursorPage(rows, None, None)
+
+    sort_key = sort_column.key
+    id_key = id_column.key
+    first_cursor = encode_cursor(getattr(rows[0], sort_key), getattr(rows[0], id_key))
+    last_cursor = encode_cursor(getattr(rows[-1], sort_key), getattr(rows[-1], id_key))
+
+    # 查询方向上是否还有数据由多取的一行判断；另一方向上只要传了游标就至少还有游标所在的那条
+    has_prev = has_more if backwards else cursor is not None
+    has_next = cursor is not None if backwards else has_more
+    return CursorPage(
+        rows,
+        first_cursor if has_prev else None,
+        last_cursor if has_next else None,
+    )
+
+def set_cursor_headers(response: Response, page: CursorPage) -> None:
+    """通过响应头返回前后页游标，响应体保持为列表以兼容旧客户端"""
+    if page.prev_cursor:
+        response.headers["X-Prev-Cursor"] = page.prev_cursor
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+
+def list_response(items: List[Any], response: Response) -> ORJSONResponse:
+    """
+    直接序列化列表响应
+
+    跳过 response_model 的校验和 jsonable_encoder，适用于已经构建好字典的热点列表接口；
+    保留通过 response 参数设置的游标、ETag 等响应头。
+    """
+    return ORJSONResponse(items, headers=dict(response.headers))
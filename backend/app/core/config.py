@@ -1,31 +1,162 @@
+from pydantic import BaseModel, field_validator
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 import os
 from dotenv import load_dotenv
 
 # 加载.env文件中的环境变量
 load_dotenv()
 
+class LLMRoute(BaseModel):
+    """单个任务使用的模型和生成参数"""
+    model: Optional[str] = None  # 为空时使用 LLM_MODEL
+    max_tokens: Optional[int] = None  # 为空时不限制
+    temperature: float = 0.7
+    top_p: float = 0.8
+    timeout: Optional[float] = None  # 为空时使用 LLM_TIMEOUT
+
+# 各任务的默认路由：回复使用首选模型，标题、推荐问题等简单任务使用更快的小模型并限制输出长度
+DEFAULT_LLM_ROUTES: Dict[str, Dict[str, Any]] = {
+    "reply": {"max_tokens": 800},
+    "options": {"model": "qwen-turbo", "max_tokens": 200},
+    "topics": {"model": "qwen-turbo", "max_tokens": 300, "temperature": 0.9},
+    "title": {"model": "qwen-turbo", "max_tokens": 40, "temperature": 0.3, "timeout": 15.0},
+    "summary": {"model": "qwen-turbo", "max_tokens": 300, "temperature": 0.3},
+}
+
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "英语学习应用"
     
     # 数据库配置
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+    DATABASE_READ_REPLICA_URL: Optional[str] = os.getenv("DATABASE_READ_REPLICA_URL")  # 只读副本，未配置时读写都走主库
+    
+    # 连接池配置（SQLite 以外的数据库）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800  # 连接回收时间（秒）
+    DB_POOL_TIMEOUT: int = 30  # 获取连接的等待时间（秒）
+    DB_POOL_PRE_PING: bool = True
+    # 应用启动时执行未完成的数据库迁移（直接用 uvicorn 启动时旧数据库也能使用新增的列）；
+    # 多进程部署时建议关闭，在发布时执行一次 alembic upgrade head
+    DB_MIGRATE_ON_STARTUP: bool = True
+    
+    # SQLite 配置
+    SQLITE_WAL: bool = True  # 开启WAL模式，读写可以并发
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 等待写锁的时间（毫秒）
+    
+    # 在响应头 X-Query-Count 中返回本次请求执行的SQL数（用于排查 N+1 查询）
+    SQL_QUERY_COUNT_HEADER: bool = False
+    
+    # 响应压缩配置（客户端支持时优先使用 zstd，其次 gzip）
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    GZIP_COMPRESSION_LEVEL: int = 6
+    ZSTD_COMPRESSION_LEVEL: int = 3
+    
+    # 列表分页配置
+    PAGINATION_ALLOW_UNBOUNDED: bool = True  # 未传 limit 时返回全部数据（兼容旧客户端）；关闭后使用默认条数
+    PAGINATION_DEFAULT_LIMIT: int = 50
+    PAGINATION_MAX_LIMIT: int = 200
     
     # 通义千问API密钥
     DASHSCOPE_API_KEY: Optional[str] = os.getenv("DASHSCOPE_API_KEY")
+    DASHSCOPE_BASE_URL: str = "https://dashscope.aliyuncs.com/api/v1"
+    
+    # 模型调用配置
+    LLM_PROVIDER: str = "dashscope"  # dashscope / mock（本地模拟，不访问网络，用于离线压测）
+    LLM_TIMEOUT: float = 60.0  # 单次调用超时（秒）
+    LLM_CONNECT_TIMEOUT: float = 5.0  # 建立连接超时（秒）
+    LLM_MAX_CONCURRENCY: int = 200  # 同时进行的模型调用上限
+    LLM_MAX_CONNECTIONS: int = 200  # 连接池最大连接数
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 50  # 连接池保持的空闲连接数
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True  # 合并进行中的相同请求（提示词和参数完全相同）
+    LLM_MODEL: str = "qwen-max"  # 首选模型
+    LLM_FALLBACK_MODELS: List[str] = ["qwen-turbo"]  # 首选模型不可用或超时后依次尝试的备用模型
+    LLM_PRIMARY_TIMEOUT: float = 20.0  # 有备用模型时，非最后一个候选模型的超时（秒），超时后直接改用下一个模型
+    LLM_RETRY_ATTEMPTS: int = 2  # 每个模型的最多尝试次数（仅对限流、服务端错误等可重试的错误重试）
+    LLM_RETRY_BACKOFF: float = 0.5  # 首次重试前的等待时间（秒），之后指数增长并加随机抖动
+    LLM_RETRY_BACKOFF_MAX: float = 4.0  # 重试等待时间上限（秒）
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断该模型
+    LLM_BREAKER_RECOVERY_SECONDS: float = 30.0  # 熔断持续时间（秒），之后放行一个试探请求
+    # 按任务路由（reply / options / topics / title / summary），环境变量中只需给出要覆盖的字段，
+    # 例如 LLM_ROUTES='{"title": {"model": "qwen-plus"}}'
+    LLM_ROUTES: Dict[str, LLMRoute] = {task: LLMRoute(**route) for task, route in DEFAULT_LLM_ROUTES.items()}
+    
+    # 本地模拟服务配置（LLM_PROVIDER=mock 或 TTS_PROVIDER=mock 时使用）
+    MOCK_SEED: int = 0  # 错误注入的随机数种子，相同的调用顺序得到相同的结果
+    MOCK_LLM_LATENCY: float = 0.5  # 首个token前的延迟（秒）
+    MOCK_LLM_TOKENS_PER_SECOND: float = 50.0  # 输出速度，0 表示不限
+    MOCK_LLM_OUTPUT_TOKENS: int = 60  # 文本输出的token数（不超过任务路由的 max_tokens）
+    MOCK_LLM_ERROR_RATE: float = 0.0  # 返回服务端错误的概率（0~1）
+    MOCK_TTS_LATENCY: float = 0.2  # 第一个音频块前的延迟（秒）
+    MOCK_TTS_BYTES_PER_SECOND: int = 24000  # 合成速度（字节/秒），0 表示不限；音频本身为 6000 字节/秒
+    MOCK_TTS_ERROR_RATE: float = 0.0  # 合成失败的概率（0~1）
     
     # CORS配置
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:5173"]
     
     # 安全配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-development-only")
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 访问令牌有效期（分钟）
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000  # 已验证用户身份的缓存条数（LRU淘汰）
+    AUTH_PRINCIPAL_CACHE_TTL: int = 300  # 通过 user_id 参数解析的用户身份缓存时间（秒）
+    AUTH_ALLOW_USER_ID_PARAM: bool = False  # 兼容旧客户端：请求没有令牌时接受 user_id 参数（默认关闭，只接受令牌）
+    BCRYPT_ROUNDS: int = 12  # bcrypt 计算成本；修改后旧密码会在用户下次登录时重新哈希
+    PASSWORD_HASH_WORKERS: int = 4  # 密码哈希线程数
+    LOGIN_RATE_LIMIT_PER_USER: int = 10  # 每个用户名在时间窗口内允许的登录次数
+    LOGIN_RATE_LIMIT_PER_IP: int = 120  # 每个IP在时间窗口内允许的登录次数（同一教室可能共用一个出口IP）
+    LOGIN_RATE_LIMIT_WINDOW: int = 60  # 登录限流的时间窗口（秒）
     
     # 音频文件配置
     AUDIO_FILES_DIR: str = "static/audio_files"  # 相对于项目根目录
     AUDIO_FILES_MAX_AGE: int = 24  # 音频文件保存时间（小时）
+    AUDIO_CACHE_MAX_BYTES: int = 500 * 1024 * 1024  # 音频缓存总大小上限（字节）
+    AUDIO_CACHE_CLEANUP_INTERVAL: int = 60  # 清理过期和超出上限的音频文件的最小间隔（秒）
+    TTS_PROVIDER: str = "edge"  # edge / mock（本地模拟，不访问网络，用于离线压测）
+    TTS_MAX_CONCURRENCY: int = 8  # 同时进行的语音合成数量上限
+    TTS_PRESYNTHESIZE_ENABLED: bool = False  # 是否为新的AI回复在后台预合成语音
+    TTS_PRESYNTHESIZE_QUEUE_SIZE: int = 100  # 预合成队列长度，满时丢弃新任务
+    TTS_PRESYNTHESIZE_WORKERS: int = 2  # 预合成的后台任务数（应小于 TTS_MAX_CONCURRENCY）
+    
+    # AI结果缓存配置（推荐问题、生成话题）
+    AI_CACHE_BACKEND: str = "memory"  # memory / redis / none
+    AI_CACHE_REDIS_URL: str = "redis://localhost:6379/0"  # 使用redis后端时的连接地址
+    AI_CACHE_MAX_ENTRIES: int = 10000  # 进程内缓存的条目上限（LRU淘汰）
+    AI_OPTIONS_CACHE_TTL: int = 3600  # 推荐问题缓存时间（秒）
+    AI_TOPICS_CACHE_TTL: int = 86400  # 生成话题缓存时间（秒）
+    AI_COMBINED_OPTIONS_ENABLED: bool = True  # 生成回复时在同一次模型调用中生成推荐问题并缓存
+    
+    # 角色与预定义话题缓存配置（进程内，修改时主动失效）
+    CATALOG_CACHE_TTL: int = 300  # 缓存时间（秒），多进程部署时也是其他进程看到修改的最长延迟
+    CATALOG_CACHE_MAX_ENTRIES: int = 10000  # 缓存条目上限（LRU淘汰）
+    
+    # 对话上下文配置
+    CONTEXT_RECENT_TURNS: int = 6  # 逐条保留的最近对话轮数（每轮包含用户和AI各一条消息）
+    CONTEXT_TOKEN_BUDGET: int = 2000  # 提示词中对话部分的token预算
+    PROMPT_CACHE_MAX_CONVERSATIONS: int = 1000  # 缓存已渲染历史的对话数上限（LRU淘汰）
     
+    # 对话标题/摘要后台生成配置
+    TITLE_REGENERATE_EVERY_N_MESSAGES: int = 6  # 每新增N条消息才重新生成一次标题和摘要
+    TITLE_QUEUE_MAX_SIZE: int = 1000  # 后台任务队列长度上限
+    
+    @field_validator("LLM_ROUTES", mode="before")
+    @classmethod
+    def merge_default_routes(cls, value: Any) -> Any:
+        """在默认路由表上合并覆盖的字段"""
+        if not isinstance(value, dict):
+            return value
+        routes = {task: dict(route) for task, route in DEFAULT_LLM_ROUTES.items()}
+        for task, route in value.items():
+            override = route.model_dump(exclude_unset=True) if isinstance(route, LLMRoute) else dict(route)
+            routes[task] = {**routes.get(task, {}), **override}
+        return routes
+
+    def llm_route(self, task: str) -> LLMRoute:
+        """获取任务的路由，未配置的任务使用 reply 的路由"""
+        return self.LLM_ROUTES.get(task) or self.LLM_ROUTES["reply"]
+
     class Config:
         case_sensitive = True
 
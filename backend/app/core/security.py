@@ -1,7 +1,24 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
 from passlib.context import CryptContext
 
-# 密码上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.config import settings
+
+# 密码上下文；已有哈希的 bcrypt 轮数与配置不同时 needs_update 为True，登录时会透明地重新哈希
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# 密码哈希专用线程池（bcrypt 计算时释放GIL），避免占满处理请求的线程池和事件循环
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
 
 # 验证密码
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -9,4 +26,54 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 # 获取密码哈希
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+# 在密码哈希线程池中计算密码哈希
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, pwd_context.hash, password)
+
+# 在密码哈希线程池中验证密码；哈希需要升级（例如 bcrypt 轮数改变）时同时返回新的哈希，否则为None
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await asyncio.get_running_loop().run_in_executor(
+        _password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+# 用户不存在时在密码哈希线程池中验证一个固定的哑哈希（轮数与配置相同），使响应时间与用户存在时一致，不暴露哪些用户名已注册
+async def dummy_verify_password_async() -> None:
+    await asyncio.get_running_loop().run_in_executor(_password_executor, pwd_context.dummy_verify)
+
+# 令牌头部固定为 HS256，验证时不接受其他算法
+_TOKEN_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').decode("ascii").rstrip("=")
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(message: bytes) -> str:
+    return _b64encode(hmac.new(settings.SECRET_KEY.encode("utf-8"), message, hashlib.sha256).digest())
+
+# 生成访问令牌（HS256 签名的 JWT）
+def create_access_token(claims: Dict[str, Any], expires_minutes: Optional[int] = None) -> str:
+    now = int(time.time())
+    expires_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES if expires_minutes is None else expires_minutes
+    payload = dict(claims, iat=now, exp=now + expires_minutes * 60)
+    signing_input = _TOKEN_HEADER + "." + _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return signing_input + "." + _sign(signing_input.encode("ascii"))
+
+# 验证访问令牌，返回其中的声明；签名错误、格式错误或已过期时返回None
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    try:
+        header, payload, signature = token.split(".")
+        if header != _TOKEN_HEADER:
+            return None
+        if not hmac.compare_digest(signature, _sign(f"{header}.{payload}".encode("ascii"))):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, UnicodeError):
+        return None
+
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), int) or claims["exp"] <= time.time():
+        return None
+    return claims
@@ -1,171 +1,187 @@
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from app.models.models import User, Character, CharacterTag, TopicCategory, PredefinedTopic, Conversation, Message, Wordcard
+from app.models.models import User, Character, CharacterTag, TopicCategory, PredefinedTopic, Conversation, Message, Wordcard, AppMeta, generate_uuid
 from app.core.security import get_password_hash
 from datetime import datetime, timedelta
 
+# 初始数据版本；修改下面的初始数据后需要递增，已部署的数据库会在下次启动时补充缺少的数据
+SEED_VERSION = "1"
+SEED_VERSION_KEY = "seed_version"
+
 # 初始化数据库
 def init_db(db: Session) -> None:
-    # 创建默认用户
-    admin_user = create_default_user(db)
-    
-    # 创建示例用户
-    demo_user = create_demo_user(db)
-    
-    # 创建默认角色
-    characters = create_default_characters(db)
-    
-    # 创建预定义话题
-    create_predefined_topics(db)
-    
-    # 创建示例对话和消息
-    create_sample_conversations(db, demo_user.id, characters)
+    """
+    写入初始数据
 
-# 创建默认用户
-def create_default_user(db: Session) -> User:
-    # 检查是否已存在默认用户
-    user = db.query(User).filter(User.username == "admin").first()
-    if not user:
-        user = User(
-            username="admin",
-            email="admin@example.com",
-            hashed_password=get_password_hash("admin"),
-        )
-        db.add(user)
+    版本标记已是最新时只需一次查询即返回；否则在同一个事务中批量补充缺少的数据并更新标记。
+    """
+    marker = db.get(AppMeta, SEED_VERSION_KEY)
+    if marker is not None and marker.value == SEED_VERSION:
+        return
+
+    try:
+        # 创建默认用户和示例用户
+        users = create_default_users(db)
+
+        # 创建默认角色
+        characters = create_default_characters(db)
+
+        # 创建预定义话题
+        create_predefined_topics(db)
+
+        # 创建示例对话和消息
+        create_sample_conversations(db, users["demo"], characters)
+
+        db.merge(AppMeta(key=SEED_VERSION_KEY, value=SEED_VERSION))
         db.commit()
-    return user
+    except Exception:
+        db.rollback()
+        raise
+
+# 创建默认用户和示例用户
+def create_default_users(db: Session) -> dict:
+    """返回 用户名 -> 用户ID"""
+    default_users = [
+        {"username": "admin", "email": "admin@example.com", "password": "admin"},
+        {"username": "demo", "email": "demo@example.com", "password": "demo123"},
+    ]
+
+    # 检查是否已存在默认用户
+    existing = dict(db.execute(
+        select(User.username, User.id).where(User.username.in_([u["username"] for u in default_users]))
+    ).all())
+
+    rows = [
+        {
+            "id": generate_uuid(),
+            "username": user["username"],
+            "email": user["email"],
+            "hashed_password": get_password_hash(user["password"]),
+        }
+        for user in default_users if user["username"] not in existing
+    ]
+    if rows:
+        db.execute(insert(User), rows)
+        existing.update({row["username"]: row["id"] for row in rows})
+    return existing
 
 # 创建示例对话和消息
 def create_sample_conversations(db: Session, user_id: str, characters: list) -> None:
     # 检查是否已存在示例对话
-    existing_conversations = db.query(Conversation).filter(Conversation.user_id == user_id).all()
-    if existing_conversations:
+    existing_conversation = db.execute(
+        select(Conversation.id).where(Conversation.user_id == user_id).limit(1)
+    ).scalar()
+    if existing_conversation:
         return
-    
+
     # 获取第一个角色用于创建对话
-    character = characters[0] if characters else None
-    if not character:
+    character_id = characters[0] if characters else None
+    if not character_id:
         return
-    
-    # 创建示例对话1
-    conv1 = Conversation(
-        id="conv-1",
-        character_id=character.id,
-        user_id=user_id,
-        title="探讨宇宙的起源",
-        topic="科学",
-        summary="关于大爆炸理论的一些初步讨论...",
-        created_at=datetime.now() - timedelta(days=3),
-        updated_at=datetime.now() - timedelta(days=3),
-        background_url="https://w.wallhaven.cc/full/po/wallhaven-po2vg3.jpg"
-    )
-    db.add(conv1)
-    db.flush()
-    
-    # 创建对话1的消息
-    messages1 = [
-        Message(
-            id="msg-1-1",
-            conversation_id=conv1.id,
-            content="Hello, traveler. Welcome to the Royal Library. What ancient secrets are you interested in?",
-            is_user=False,
-            timestamp=datetime.now() - timedelta(days=3, minutes=30)
-        ),
-        Message(
-            id="msg-1-2",
-            conversation_id=conv1.id,
-            content="I have been studying the legends about Atlantis. Are there any clues?",
-            is_user=True,
-            timestamp=datetime.now() - timedelta(days=3, minutes=29)
-        ),
-        Message(
-            id="msg-1-3",
-            conversation_id=conv1.id,
-            content="A wise choice. Many people think it is just a myth, but some ancient texts hint at its real existence.",
-            is_user=False,
-            timestamp=datetime.now() - timedelta(days=3, minutes=28)
-        )
+
+    now = datetime.now()
+    conversations = [
+        # 示例对话1
+        {
+            "id": "conv-1",
+            "character_id": character_id,
+            "user_id": user_id,
+            "title": "探讨宇宙的起源",
+            "topic": "科学",
+            "summary": "关于大爆炸理论的一些初步讨论...",
+            "created_at": now - timedelta(days=3),
+            "updated_at": now - timedelta(days=3),
+            "background_url": "https://w.wallhaven.cc/full/po/wallhaven-po2vg3.jpg",
+        },
+        # 示例对话2
+        {
+            "id": "conv-2",
+            "character_id": character_id,
+            "user_id": user_id,
+            "title": "如何烤出完美的披萨",
+            "topic": "烹饪",
+            "summary": "从面团发酵到烤箱温度的精确控制...",
+            "created_at": now - timedelta(days=6),
+            "updated_at": now - timedelta(days=6),
+            "background_url": None,
+        },
     ]
-    for msg in messages1:
-        db.add(msg)
-    
-    # 创建示例对话2
-    conv2 = Conversation(
-        id="conv-2",
-        character_id=character.id,
-        user_id=user_id,
-        title="如何烤出完美的披萨",
-        topic="烹饪",
-        summary="从面团发酵到烤箱温度的精确控制...",
-        created_at=datetime.now() - timedelta(days=6),
-        updated_at=datetime.now() - timedelta(days=6)
-    )
-    db.add(conv2)
-    db.flush()
-    
-    # 创建对话2的消息
-    messages2 = [
-        Message(
-            conversation_id=conv2.id,
-            content="你好，我想学习如何制作披萨。",
-            is_user=True,
-            timestamp=datetime.now() - timedelta(days=6, minutes=45)
-        ),
-        Message(
-            conversation_id=conv2.id,
-            content="制作披萨的关键在于面团和烤箱温度。首先，你需要准备好面粉、酵母、水和盐。",
-            is_user=False,
-            timestamp=datetime.now() - timedelta(days=6, minutes=44)
-        )
+    conv1_id = conversations[0]["id"]
+    conv2_id = conversations[1]["id"]
+
+    messages = [
+        # 对话1的消息
+        {
+            "id": "msg-1-1",
+            "conversation_id": conv1_id,
+            "content": "Hello, traveler. Welcome to the Royal Library. What ancient secrets are you interested in?",
+            "is_user": False,
+            "timestamp": now - timedelta(days=3, minutes=30),
+        },
+        {
+            "id": "msg-1-2",
+            "conversation_id": conv1_id,
+            "content": "I have been studying the legends about Atlantis. Are there any clues?",
+            "is_user": True,
+            "timestamp": now - timedelta(days=3, minutes=29),
+        },
+        {
+            "id": "msg-1-3",
+            "conversation_id": conv1_id,
+            "content": "A wise choice. Many people think it is just a myth, but some ancient texts hint at its real existence.",
+            "is_user": False,
+            "timestamp": now - timedelta(days=3, minutes=28),
+        },
+        # 对话2的消息
+        {
+            "id": generate_uuid(),
+            "conversation_id": conv2_id,
+            "content": "你好，我想学习如何制作披萨。",
+            "is_user": True,
+            "timestamp": now - timedelta(days=6, minutes=45),
+        },
+        {
+            "id": generate_uuid(),
+            "conversation_id": conv2_id,
+            "content": "制作披萨的关键在于面团和烤箱温度。首先，你需要准备好面粉、酵母、水和盐。",
+            "is_user": False,
+            "timestamp": now - timedelta(days=6, minutes=44),
+        },
     ]
-    for msg in messages2:
-        db.add(msg)
-    
-    # 创建示例单词卡
+
+    # 示例单词卡
     wordcards = [
-        Wordcard(
-            id="word-1",
-            user_id=user_id,
-            word="Apple",
-            pronunciation="[æpl]",
-            pos="noun",
-            context="An apple is a round fruit with red or green skin and a whitish inside.",
-            conversation_id=conv1.id,
-            message_id=messages1[0].id,
-            created_at=datetime.now() - timedelta(days=3)
-        ),
-        Wordcard(
-            id="word-2",
-            user_id=user_id,
-            word="Banana",
-            pronunciation="[bəˈnɑ:nə]",
-            pos="noun",
-            context="Bananas are long curved fruits with yellow skins.",
-            conversation_id=conv2.id,
-            message_id=messages2[1].id,
-            created_at=datetime.now() - timedelta(days=6)
-        )
+        {
+            "id": "word-1",
+            "user_id": user_id,
+            "word": "Apple",
+            "pronunciation": "[æpl]",
+            "pos": "noun",
+            "context": "An apple is a round fruit with red or green skin and a whitish inside.",
+            "conversation_id": conv1_id,
+            "message_id": messages[0]["id"],
+            "created_at": now - timedelta(days=3),
+        },
+        {
+            "id": "word-2",
+            "user_id": user_id,
+            "word": "Banana",
+            "pronunciation": "[bəˈnɑ:nə]",
+            "pos": "noun",
+            "context": "Bananas are long curved fruits with yellow skins.",
+            "conversation_id": conv2_id,
+            "message_id": messages[4]["id"],
+            "created_at": now - timedelta(days=6),
+        },
     ]
-    for card in wordcards:
-        db.add(card)
-    
-    db.commit()
 
-# 创建示例用户
-def create_demo_user(db: Session) -> User:
-    # 检查是否已存在示例用户
-    user = db.query(User).filter(User.username == "demo").first()
-    if not user:
-        user = User(
-            username="demo",
-            email="demo@example.com",
-            hashed_password=get_password_hash("demo123"),
-        )
-        db.add(user)
-        db.commit()
-    return user
+    db.execute(insert(Conversation), conversations)
+    db.execute(insert(Message), messages)
+    db.execute(insert(Wordcard), wordcards)
 
 # 创建默认角色
 def create_default_characters(db: Session) -> list:
+    """返回默认角色的ID列表"""
     # 默认角色数据
     default_characters = [
         {
@@ -193,29 +209,31 @@ def create_default_characters(db: Session) -> list:
             "tags": ["明日方舟", "医疗", "罗德岛"],
         },
     ]
-    
+
     # 检查是否已存在默认角色
-    existing_characters = db.query(Character).filter(Character.is_default == True).all()
-    if not existing_characters:
-        for char_data in default_characters:
-            character = Character(
-                name=char_data["name"],
-                description=char_data["description"],
-                avatar_url=char_data["avatar_url"],
-                is_default=True,
-            )
-            db.add(character)
-            db.flush()  # 获取ID
-            
-            # 添加标签
-            for tag in char_data["tags"]:
-                char_tag = CharacterTag(character_id=character.id, tag=tag)
-                db.add(char_tag)
-        
-        db.commit()
-    
-    # 返回所有角色
-    return db.query(Character).filter(Character.is_default == True).all()
+    existing_ids = db.execute(
+        select(Character.id).where(Character.is_default == True).order_by(Character.created_at)
+    ).scalars().all()
+    if existing_ids:
+        return list(existing_ids)
+
+    characters = []
+    tags = []
+    for char_data in default_characters:
+        character_id = generate_uuid()
+        characters.append({
+            "id": character_id,
+            "name": char_data["name"],
+            "description": char_data["description"],
+            "avatar_url": char_data["avatar_url"],
+            "is_default": True,
+        })
+        # 添加标签
+        tags.extend({"id": generate_uuid(), "character_id": character_id, "tag": tag} for tag in char_data["tags"])
+
+    db.execute(insert(Character), characters)
+    db.execute(insert(CharacterTag), tags)
+    return [character["id"] for character in characters]
 
 # 创建预定义话题
 def create_predefined_topics(db: Session) -> None:
@@ -244,22 +262,21 @@ def create_predefined_topics(db: Session) -> None:
             "Planning a hiking trip",
         ],
     }
-    
+
     # 检查是否已存在预定义话题
-    existing_categories = db.query(TopicCategory).all()
-    if not existing_categories:
-        for category_name, topics in predefined_topics.items():
-            # 创建分类
-            category = TopicCategory(name=category_name)
-            db.add(category)
-            db.flush()  # 获取ID
-            
-            # 创建话题
-            for topic_content in topics:
-                topic = PredefinedTopic(
-                    category_id=category.id,
-                    content=topic_content,
-                )
-                db.add(topic)
-        
-        db.commit()
\ No newline at end of file
+    existing_category = db.execute(select(TopicCategory.id).limit(1)).scalar()
+    if existing_category:
+        return
+
+    categories = []
+    topics = []
+    for category_name, contents in predefined_topics.items():
+        category_id = generate_uuid()
+        categories.append({"id": category_id, "name": category_name})
+        topics.extend(
+            {"id": generate_uuid(), "category_id": category_id, "content": content}
+            for content in contents
+        )
+
+    db.execute(insert(TopicCategory), categories)
+    db.execute(insert(PredefinedTopic), topics)
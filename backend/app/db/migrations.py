@@ -0,0 +1,57 @@
+import logging
+import os
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# backend 目录（alembic.ini 所在目录）
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def alembic_config() -> Config:
+    """加载 alembic 配置，与工作目录无关"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return config
+
+def legacy_revision(connection: Connection) -> Optional[str]:
+    """
+    旧版本由 create_all 建立、没有迁移记录的数据库所对应的迁移版本
+
+    新数据库或已有迁移记录时返回None。
+    """
+    inspector = inspect(connection)
+    tables = inspector.get_table_names()
+    if "alembic_version" in tables or "conversations" not in tables:
+        return None
+    columns = {column["name"] for column in inspector.get_columns("conversations")}
+    return "0002" if "summarized_message_count" in columns else "0001"
+
+def upgrade_database(engine: Engine) -> None:
+    """
+    把数据库升级到最新版本
+
+    版本已是最新时只查询一次当前版本号就返回。
+    """
+    config = alembic_config()
+    head = ScriptDirectory.from_config(config).get_current_head()
+
+    with engine.begin() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current == head:
+            return
+
+        config.attributes["connection"] = connection
+        legacy = legacy_revision(connection)
+        if legacy is not None:
+            logger.info(f"检测到没有迁移记录的旧数据库，标记为版本 {legacy}")
+            command.stamp(config, legacy)
+
+        logger.info(f"升级数据库: {current or legacy} -> {head}")
+        command.upgrade(config, "head")
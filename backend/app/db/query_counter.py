@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class QueryCounter:
+    """记录执行过的SQL语句"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def assert_at_most(self, expected: int) -> None:
+        """断言执行的语句数不超过 expected，用于防止 N+1 查询回归"""
+        if self.count > expected:
+            executed = "\n".join(self.statements)
+            raise AssertionError(f"期望最多执行 {expected} 条SQL，实际执行了 {self.count} 条:\n{executed}")
+
+# 当前上下文的计数器；请求和异步任务各自拥有独立的上下文
+_current_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.statements.append(statement)
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    统计代码块内（包括同步、异步引擎）执行的SQL语句
+
+    用法:
+        with count_queries() as counter:
+            client.get("/api/conversations/user/demo")
+        counter.assert_at_most(2)
+    """
+    counter = QueryCounter()
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
@@ -1,17 +1,88 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    """根据数据库类型选择连接参数和连接池配置"""
+    if _is_sqlite(url):
+        # SQLite 连接会跨线程使用；timeout 为等待写锁的秒数
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """为每个新的 SQLite 连接开启 WAL 并设置忙等待超时，读写不再互相阻塞"""
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+def create_db_engine(url: str) -> Engine:
+    """创建数据库引擎"""
+    db_engine = create_engine(url, **_engine_options(url))
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+# 同步驱动 -> 异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """把同步数据库URL转换为对应异步驱动的URL"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"不支持的异步数据库类型: {backend}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """创建异步数据库引擎，连接参数与同步引擎一致"""
+    db_engine = create_async_engine(to_async_url(url), **_engine_options(url))
+    if _is_sqlite(url):
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
 # 创建数据库引擎
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_db_engine(settings.DATABASE_URL)
 
-# 创建会话工厂
+# 创建会话工厂（初始化数据库和后台任务使用）
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# 获取数据库会话的依赖函数
-def get_db():
-    db = SessionLocal()
-    try:
+# 异步引擎与会话工厂（提交后不过期对象，避免在异步上下文中隐式加载）；只读副本未配置时与主库相同
+async_engine = create_async_db_engine(settings.DATABASE_URL)
+async_read_engine = create_async_db_engine(settings.DATABASE_READ_REPLICA_URL) if settings.DATABASE_READ_REPLICA_URL else async_engine
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# 获取异步数据库会话的依赖函数
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# 获取异步只读数据库会话的依赖函数
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -1,14 +1,29 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api.api_v1.api import api_router
+from app.api.compression import CompressionMiddleware
+from app.api.http_cache import ETagMiddleware
 from app.core.config import settings
+from app.db.migrations import upgrade_database
+from app.db.session import engine
+from app.db.query_counter import count_queries
+from app.services.llm_gateway import close_clients
+from app.services.tts_service import tts_prefetcher
 
 app = FastAPI(
     title="英语学习应用API",
     description="英语学习应用的后端API",
     version="0.1.0",
+    # 默认使用 orjson 序列化响应
+    default_response_class=ORJSONResponse,
 )
 
+# 为 GET JSON 响应生成 ETag 并处理条件请求（在 CORS 内层，304 响应同样带 CORS 头）
+app.add_middleware(ETagMiddleware)
+
 # 设置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -16,8 +31,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Prev-Cursor", "X-Next-Cursor", "X-Query-Count", "ETag"],
 )
 
+# 按配置压缩响应（在 ETag 中间件外层，压缩后的响应 ETag 附加编码名）
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE,
+        gzip_level=settings.GZIP_COMPRESSION_LEVEL,
+        zstd_level=settings.ZSTD_COMPRESSION_LEVEL,
+    )
+
+# 按配置在响应头中返回本次请求执行的SQL数
+if settings.SQL_QUERY_COUNT_HEADER:
+    @app.middleware("http")
+    async def add_query_count_header(request: Request, call_next):
+        with count_queries() as counter:
+            response = await call_next(request)
+        response.headers["X-Query-Count"] = str(counter.count)
+        return response
+
+# 应用启动时按配置升级数据库并启动语音预合成
+@app.on_event("startup")
+async def startup_event():
+    if settings.DB_MIGRATE_ON_STARTUP:
+        # 已是最新版本时只查询一次版本号
+        await asyncio.to_thread(upgrade_database, engine)
+    if settings.TTS_PRESYNTHESIZE_ENABLED:
+        await tts_prefetcher.start()
+
+# 应用关闭时停止后台任务并释放模型调用的连接池
+@app.on_event("shutdown")
+async def shutdown_event():
+    await tts_prefetcher.stop()
+    await close_clients()
+
 # 包含所有API路由
 app.include_router(api_router, prefix="/api")
 
@@ -1,6 +1,5 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Text, DateTime, Table
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
 from app.db.base_class import Base
 import uuid
 from datetime import datetime
@@ -9,6 +8,11 @@ from datetime import datetime
 def generate_uuid():
     return str(uuid.uuid4())
 
+# 时间字段的默认值：由应用生成UTC时间（精确到微秒），而不是数据库的当前时间，
+# 保证同一列的存储格式一致（分页游标可以直接比较），同一事务、同一秒内写入的数据也保持先后顺序
+def utcnow():
+    return datetime.utcnow()
+
 # 用户模型
 class User(Base):
     __tablename__ = "users"
@@ -17,8 +21,8 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=True)
     hashed_password = Column(String, nullable=False)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
     
     # 关系
     conversations = relationship("Conversation", back_populates="user")
@@ -42,8 +46,8 @@ class Character(Base):
     avatar_url = Column(String, nullable=True)  # 头像URL
     is_default = Column(Boolean, default=False)  # 是否为默认角色
     created_by = Column(String, ForeignKey("users.id"), nullable=True)  # 创建者ID，默认角色为null
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
     
     # 关系
     conversations = relationship("Conversation", back_populates="character")
@@ -59,6 +63,11 @@ class CharacterTag(Base):
     
     # 关系
     character = relationship("Character", back_populates="tags")
+    
+    __table_args__ = (
+        # 加载角色标签
+        Index("ix_character_tags_character_id", "character_id"),
+    )
 
 # 对话模型
 class Conversation(Base):
@@ -69,16 +78,24 @@ class Conversation(Base):
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
     topic = Column(String, nullable=False)  # 话题/场景
-    summary = Column(Text, nullable=True)  # 对话摘要
+    summary = Column(Text, nullable=True)  # 对话摘要（较早消息的滚动摘要）
+    summarized_message_count = Column(Integer, default=0, server_default="0", nullable=False)  # 已合并进摘要的最早消息数
     background_url = Column(String, nullable=True)  # 背景图片URL
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
     
     # 关系
     character = relationship("Character", back_populates="conversations")
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
     wordcards = relationship("Wordcard", back_populates="conversation")
+    
+    __table_args__ = (
+        # 用户的对话列表（按更新时间倒序）
+        Index("ix_conversations_user_id_updated_at", "user_id", "updated_at"),
+        # 角色的对话列表
+        Index("ix_conversations_character_id", "character_id"),
+    )
 
 # 消息模型
 class Message(Base):
@@ -88,11 +105,16 @@ class Message(Base):
     conversation_id = Column(String, ForeignKey("conversations.id"), nullable=False)
     content = Column(Text, nullable=False)
     is_user = Column(Boolean, default=False)  # 是否为用户消息
-    timestamp = Column(DateTime, default=func.now())
+    timestamp = Column(DateTime, default=utcnow)
     
     # 关系
     conversation = relationship("Conversation", back_populates="messages")
     wordcards = relationship("Wordcard", back_populates="message")
+    
+    __table_args__ = (
+        # 对话的消息历史、最近消息和消息计数
+        Index("ix_messages_conversation_id_timestamp", "conversation_id", "timestamp"),
+    )
 
 # 单词卡模型
 class Wordcard(Base):
@@ -106,12 +128,17 @@ class Wordcard(Base):
     context = Column(Text, nullable=True)  # 上下文或定义
     conversation_id = Column(String, ForeignKey("conversations.id"), nullable=True)
     message_id = Column(String, ForeignKey("messages.id"), nullable=True)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=utcnow)
     
     # 关系
     user = relationship("User", back_populates="wordcards")
     conversation = relationship("Conversation", back_populates="wordcards")
     message = relationship("Message", back_populates="wordcards")
+    
+    __table_args__ = (
+        # 同一用户的单词只能收藏一次，同时用于收藏检查和收藏列表
+        Index("uq_wordcards_user_id_word", "user_id", "word", unique=True),
+    )
 
 # 预定义话题类别模型
 class TopicCategory(Base):
@@ -132,4 +159,16 @@ class PredefinedTopic(Base):
     content = Column(String, nullable=False)
     
     # 关系
-    category = relationship("TopicCategory", back_populates="topics")
\ No newline at end of file
+    category = relationship("TopicCategory", back_populates="topics")
+    
+    __table_args__ = (
+        # 按类别加载话题
+        Index("ix_predefined_topics_category_id", "category_id"),
+    )
+
+# 应用元数据（键值对），用于记录初始数据版本等标记
+class AppMeta(Base):
+    __tablename__ = "app_meta"
+    
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
@@ -1,107 +1,327 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+import hashlib
 import json
 import logging
+import re
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, AIMessage
-from dashscope import Generation
 
 from app.core.config import settings
 from app.models.models import Message, Character
+from app.services.cache import create_response_cache
+from app.services.llm_gateway import LLMError, llm_gateway
+from app.services.single_flight import SingleFlight
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 通义千问模型配置
-MODEL_NAME = "qwen-max"
+# 合并进行中的相同模型请求（重复点击、前端重试时只调用一次）
+llm_single_flight = SingleFlight()
 
-def call_qwen_model(prompt: str) -> str:
-    """调用通义千问模型"""
-    try:
-        response = Generation.call(
-            model=MODEL_NAME,
-            prompt=prompt,
-            api_key=settings.DASHSCOPE_API_KEY,
-            temperature=0.7,
-            top_p=0.8,
-            result_format='message',
-        )
-        
-        if response.status_code == 200:
-            return response.output.choices[0].message.content
-        else:
-            logger.error(f"调用通义千问模型失败: {response.code}, {response.message}")
-            return "Sorry, I'm unable to answer that right now."
-    except Exception as e:
-        logger.error(f"调用通义千问模型异常: {str(e)}")
-        return "Sorry, I'm experiencing some technical difficulties."
-
-def format_messages_for_prompt(messages: List[Message], character: Character, topic: str = None) -> str:
-    """将消息格式化为提示"""
-    prompt = (
+def _request_key(payload: Dict[str, Any]) -> str:
+    """模型请求的合并键：提示词和模型参数完全相同的请求视为同一请求"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _build_generation_payload(prompt: str, task: str = "reply", stream: bool = False, json_mode: bool = False) -> Dict[str, Any]:
+    """按任务路由（LLM_ROUTES）构建通义千问请求体"""
+    route = settings.llm_route(task)
+    parameters = {
+        "temperature": route.temperature,
+        "top_p": route.top_p,
+        "result_format": "message",
+    }
+    if route.max_tokens:
+        parameters["max_tokens"] = route.max_tokens
+    if stream:
+        parameters["incremental_output"] = True
+    if json_mode:
+        # 要求模型输出合法的JSON对象（提示词中需要说明JSON格式）
+        parameters["response_format"] = {"type": "json_object"}
+    return {
+        "model": route.model or settings.LLM_MODEL,
+        "input": {"prompt": prompt},
+        "parameters": parameters,
+    }
+
+def call_qwen_model(prompt: str, task: str = "reply") -> str:
+    """
+    调用通义千问模型（按任务选择模型和参数，与进行中的相同请求合并）
+
+    Raises:
+        LLMError: 重试和降级后仍然失败
+    """
+    payload = _build_generation_payload(prompt, task)
+    timeout = settings.llm_route(task).timeout
+    if not settings.LLM_SINGLE_FLIGHT_ENABLED:
+        return llm_gateway.generate(payload, timeout)
+    return llm_single_flight.do(_request_key(payload), lambda: llm_gateway.generate(payload, timeout))
+
+async def call_qwen_model_async(prompt: str, timeout: Optional[float] = None, json_mode: bool = False, task: str = "reply") -> str:
+    """
+    异步调用通义千问模型（按任务选择模型和参数，与进行中的相同请求合并，合并的调用共用先发起者的超时）
+
+    Raises:
+        LLMError: 重试和降级后仍然失败
+    """
+    payload = _build_generation_payload(prompt, task, json_mode=json_mode)
+    if timeout is None:
+        timeout = settings.llm_route(task).timeout
+    if not settings.LLM_SINGLE_FLIGHT_ENABLED:
+        return await llm_gateway.generate_async(payload, timeout)
+    return await llm_single_flight.do_async(_request_key(payload), lambda: llm_gateway.generate_async(payload, timeout))
+
+def call_qwen_model_stream_async(prompt: str, task: str = "reply") -> AsyncIterator[str]:
+    """流式调用通义千问模型，逐段返回增量文本；失败时抛出 LLMError"""
+    return llm_gateway.stream_async(_build_generation_payload(prompt, task, stream=True), settings.llm_route(task).timeout)
+
+# 推荐问题和生成话题的结果缓存
+response_cache = create_response_cache(
+    backend=settings.AI_CACHE_BACKEND,
+    max_entries=settings.AI_CACHE_MAX_ENTRIES,
+    redis_url=settings.AI_CACHE_REDIS_URL,
+    prefix="ai:",
+)
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化用户输入的提示（忽略大小写和多余空白），用于缓存键"""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+def _options_cache_key(messages: List[Message]) -> Optional[str]:
+    """推荐问题的缓存键：消息ID全局唯一，最后一条消息即可确定对话状态"""
+    if not messages:
+        return None
+    return _options_key(messages[-1].id)
+
+def _options_key(message_id: str) -> str:
+    return f"options:{message_id}"
+
+async def cache_options(message_id: str, options: List[str]) -> None:
+    """缓存以该消息结尾的对话的推荐问题（与回复一起生成时使用）"""
+    await response_cache.set(_options_key(str(message_id)), options, settings.AI_OPTIONS_CACHE_TTL)
+
+def _topics_cache_key(prompt: str, num_topics: int) -> str:
+    """生成话题的缓存键"""
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"topics:{num_topics}:{digest}"
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数（英文约4个字符一个token，中日韩字符约一个字一个token）"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+def render_message_line(is_user: bool, content: str, character_name: str) -> str:
+    """将单条消息渲染为提示词中的一行"""
+    role = "User" if is_user else character_name
+    return f"{role}: {content}\n"
+
+def format_messages_for_prompt(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> str:
+    """将消息格式化为提示
+
+    较早的对话以滚动摘要的形式给出，最近的消息逐条保留；
+    超出 CONTEXT_TOKEN_BUDGET 时从最早的消息开始丢弃，但始终保留最后一条。
+    如果传入的是带有预渲染结果的 RenderedHistory，则直接复用已渲染的行。
+    """
+    header = (
         f"You are {character.name}, {character.description}.\n"
         "Important: You must always reply only in fluent English. Never use any other language.\n"
     )
     if topic:
-        prompt += f"Current conversation topic: {topic}\n"
+        header += f"Current conversation topic: {topic}\n"
+    if summary:
+        header += f"Summary of the earlier conversation: {summary}\n"
     
-    prompt += "Conversation history:\n"
+    header += "Conversation history:\n"
     
-    for msg in messages:
-        if msg.is_user:
-            prompt += f"User: {msg.content}\n"
-        else:
-            prompt += f"{character.name}: {msg.content}\n"
+    rendered_lines = getattr(messages, "lines", None)
+    rendered_tokens = getattr(messages, "tokens", None)
+    if rendered_lines is None or rendered_tokens is None:
+        rendered_lines = [render_message_line(msg.is_user, msg.content, character.name) for msg in messages]
+        rendered_tokens = [estimate_tokens(line) for line in rendered_lines]
     
-    return prompt
+    # 从最新的消息往前取，直到用完token预算
+    budget = settings.CONTEXT_TOKEN_BUDGET - estimate_tokens(header)
+    start = len(rendered_lines)
+    while start > 0:
+        budget -= rendered_tokens[start - 1]
+        if budget < 0 and start < len(rendered_lines):
+            break
+        start -= 1
+    
+    return header + "".join(rendered_lines[start:])
+
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*(.*?)\s*```$", re.DOTALL)
+# 允许字符串中出现未转义的换行（模型输出中常见）
+_json_decoder = json.JSONDecoder(strict=False)
+
+def extract_json(text: str) -> Any:
+    """
+    从模型输出中提取JSON
+
+    允许外层的 Markdown 代码块以及JSON前后的说明文字，取第一个能完整解析的对象或数组。
+
+    Raises:
+        ValueError: 输出中没有合法的JSON
+    """
+    text = text.strip()
+    fenced = _CODE_FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return _json_decoder.decode(text)
+    except ValueError:
+        pass
+
+    for index, char in enumerate(text):
+        if char in "[{":
+            try:
+                return _json_decoder.raw_decode(text, index)[0]
+            except ValueError:
+                continue
+    raise ValueError("模型输出中没有合法的JSON")
+
+def _string_list(value: Any, limit: int) -> Optional[List[str]]:
+    """取出非空字符串列表（兼容 {"questions": [...]} 这类只有一个列表字段的对象），没有时返回None"""
+    if isinstance(value, dict):
+        lists = [item for item in value.values() if isinstance(item, list)]
+        value = lists[0] if len(lists) == 1 else None
+    if not isinstance(value, list):
+        return None
+    items = [item.strip() for item in value if isinstance(item, str) and item.strip()]
+    return items[:limit] or None
 
-def get_ai_options(messages: List[Message], character: Character, topic: str = None) -> List[str]:
-    """获取AI推荐问题"""
-    prompt = format_messages_for_prompt(messages, character, topic)
+def _build_options_prompt(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> str:
+    """构建推荐问题提示词"""
+    prompt = format_messages_for_prompt(messages, character, topic, summary)
     prompt += "\nBased on the conversation history, generate 3 possible follow-up questions the user might ask. Return ONLY a JSON array format with English questions. Format: [\"question1\", \"question2\", \"question3\"]"
-    
-    response = call_qwen_model(prompt)
-    
+    return prompt
+
+# 解析失败时返回的默认推荐问题
+DEFAULT_OPTIONS = [
+    "Can you tell me more about this topic?",
+    "What are your thoughts on this matter?",
+    "Could we discuss something else?"
+]
+
+def _parse_options(response: str) -> Optional[List[str]]:
+    """解析推荐问题（最多3个），失败时返回None"""
     try:
-        # 尝试解析JSON响应
-        options = json.loads(response)
-        if isinstance(options, list) and len(options) > 0:
-            return options[:3]  # 最多返回3个选项
-    except Exception as e:
+        options = _string_list(extract_json(response), 3)
+    except ValueError as e:
         logger.error(f"解析AI推荐问题失败: {str(e)}")
+        return None
+    if options is None:
+        logger.error("解析AI推荐问题失败: 没有问题列表")
+    return options
+
+async def get_ai_options_async(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> List[str]:
+    """异步获取AI推荐问题"""
+    cache_key = _options_cache_key(messages)
+    if cache_key:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached
     
-    # 如果解析失败，返回默认选项
-    return [
-        "Can you tell me more about this topic?",
-        "What are your thoughts on this matter?",
-        "Could we discuss something else?"
-    ]
-
-def get_ai_response(messages: List[Message], character: Character, topic: str = None) -> str:
-    """获取AI回复"""
-    prompt = format_messages_for_prompt(messages, character, topic)
-    prompt += f"\nRespond as {character.name} to the user's last message. Maintain character traits, speak naturally in English, and never mention being an AI or model."
+    try:
+        options = _parse_options(await call_qwen_model_async(_build_options_prompt(messages, character, topic, summary), task="options"))
+    except LLMError as e:
+        logger.error(f"生成AI推荐问题失败: {e}")
+        options = None
+    if options is None:
+        # 如果调用或解析失败，返回默认选项（不缓存）
+        return list(DEFAULT_OPTIONS)
     
-    response = call_qwen_model(prompt)
-    return response
+    if cache_key:
+        await response_cache.set(cache_key, options, settings.AI_OPTIONS_CACHE_TTL)
+    return options
+
+def _reply_instruction(character: Character) -> str:
+    return f"\nRespond as {character.name} to the user's last message. Maintain character traits, speak naturally in English, and never mention being an AI or model."
 
-def generate_topics(prompt: str, num_topics: int = 5) -> List[str]:
-    """根据提示生成话题"""
+def _build_response_prompt(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> str:
+    """构建角色回复提示词"""
+    return format_messages_for_prompt(messages, character, topic, summary) + _reply_instruction(character)
+
+def _build_reply_with_options_prompt(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> str:
+    """构建同时生成回复和推荐问题的提示词"""
+    prompt = format_messages_for_prompt(messages, character, topic, summary) + _reply_instruction(character)
+    prompt += (
+        "\nThen suggest 3 short follow-up questions in English that the user might ask after your reply."
+        "\nReturn ONLY a JSON object in this format: {\"reply\": \"your reply\", \"options\": [\"question1\", \"question2\", \"question3\"]}"
+    )
+    return prompt
+
+_REPLY_FIELD = re.compile(r'"reply"\s*:\s*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+
+def _parse_reply_with_options(response: str) -> Tuple[Optional[str], Optional[List[str]]]:
+    """
+    解析同时生成的回复和推荐问题
+
+    Returns:
+        (回复, 推荐问题)：推荐问题解析失败时为None；
+        输出不是JSON时把整段文本当作回复；JSON损坏且取不到回复时回复为None
+    """
+    try:
+        data = extract_json(response)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("reply"), str) and data["reply"].strip():
+        return data["reply"].strip(), _string_list(data.get("options"), 3)
+
+    # JSON被截断等情况：尽量取出 reply 字段
+    match = _REPLY_FIELD.search(response)
+    if match:
+        try:
+            return _json_decoder.decode(f'"{match.group(1)}"').strip(), None
+        except ValueError:
+            pass
+
+    text = response.strip()
+    if text and not text.startswith(("{", "[", "```")):
+        return text, None
+    return None, None
+
+async def get_ai_reply_with_options_async(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> Tuple[str, Optional[List[str]]]:
+    """
+    在一次模型调用中生成AI回复和推荐问题
+
+    Returns:
+        (回复, 推荐问题)：推荐问题解析失败时为None，由 get-ai-options 单独生成
+    """
+    response = await call_qwen_model_async(_build_reply_with_options_prompt(messages, character, topic, summary), json_mode=True)
+    reply, options = _parse_reply_with_options(response)
+    if reply is None:
+        # 取不到回复时退回单独生成回复
+        logger.error("解析AI回复和推荐问题失败，改为单独生成回复")
+        return await get_ai_response_async(messages, character, topic, summary), None
+    return reply, options
+
+async def get_ai_response_async(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> str:
+    """异步获取AI回复"""
+    return await call_qwen_model_async(_build_response_prompt(messages, character, topic, summary))
+
+def get_ai_response_stream(messages: List[Message], character: Character, topic: str = None, summary: str = None) -> AsyncIterator[str]:
+    """流式获取AI回复（提示词在调用时立即构建）"""
+    return call_qwen_model_stream_async(_build_response_prompt(messages, character, topic, summary))
+
+def _build_topics_prompt(prompt: str, num_topics: int) -> str:
+    """构建话题生成提示词"""
     system_prompt = f"Generate {num_topics} relevant conversation topics in English based on the user's prompt. Return ONLY a JSON array format. Format: [\"topic1\", \"topic2\", ...]"
-    
-    full_prompt = f"{system_prompt}\n\nUser prompt: {prompt}"
-    
-    response = call_qwen_model(full_prompt)
-    
+    return f"{system_prompt}\n\nUser prompt: {prompt}"
+
+def _parse_topics(response: str, num_topics: int) -> Optional[List[str]]:
+    """解析生成的话题，失败时返回None"""
     try:
-        # 尝试解析JSON响应
-        topics = json.loads(response)
-        if isinstance(topics, list) and len(topics) > 0:
-            return topics[:num_topics]  # 返回指定数量的话题
-    except Exception as e:
+        topics = _string_list(extract_json(response), num_topics)
+    except ValueError as e:
         logger.error(f"解析生成话题失败: {str(e)}")
-    
-    # 如果解析失败，返回默认话题
+        return None
+    if topics is None:
+        logger.error("解析生成话题失败: 没有话题列表")
+    return topics
+
+def _default_topics(prompt: str, num_topics: int) -> List[str]:
+    """解析失败时返回的默认话题"""
     return [
         f"Fundamentals of {prompt}",
         f"Common questions about {prompt}",
@@ -110,28 +330,69 @@ def generate_topics(prompt: str, num_topics: int = 5) -> List[str]:
         f"Future trends in {prompt}"
     ][:num_topics]
 
-def generate_conversation_title(messages: List[Message], character: Character, topic: str) -> str:
-    """根据对话内容生成标题"""
-    # 构建提示词
-    prompt = f"Generate a concise English title (max 15 words) for this conversation:\n\n"
+async def generate_topics_async(prompt: str, num_topics: int = 5) -> List[str]:
+    """根据提示异步生成话题"""
+    cache_key = _topics_cache_key(prompt, num_topics)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        topics = _parse_topics(await call_qwen_model_async(_build_topics_prompt(prompt, num_topics), task="topics"), num_topics)
+    except LLMError as e:
+        logger.error(f"生成话题失败: {e}")
+        topics = None
+    if topics is None:
+        return _default_topics(prompt, num_topics)
+    
+    await response_cache.set(cache_key, topics, settings.AI_TOPICS_CACHE_TTL)
+    return topics
+
+def _build_title_prompt(messages: List[Message], character: Character, topic: str, summary: str = None) -> str:
+    """构建对话标题提示词"""
+    parts = ["Generate a concise English title (max 15 words) for this conversation:\n\n"]
+    
+    # 添加较早对话的摘要
+    if summary:
+        parts.append(f"Earlier conversation summary: {summary}\n\n")
     
     # 添加对话内容
-    for msg in messages:
-        role = "User" if msg.is_user else character.name
-        prompt += f"{role}: {msg.content}\n"
+    parts.extend(render_message_line(msg.is_user, msg.content, character.name) for msg in messages)
     
     # 添加话题信息
     if topic:
-        prompt += f"\nTopic: {topic}"
+        parts.append(f"\nTopic: {topic}")
+    return "".join(parts)
+
+def generate_conversation_title(messages: List[Message], character: Character, topic: str, summary: str = None) -> str:
+    """
+    根据对话内容生成标题
+
+    Raises:
+        LLMError: 模型调用失败
+    """
+    # 调用AI生成标题（失败时抛出 LLMError，由调用方保留原标题）
+    return call_qwen_model(_build_title_prompt(messages, character, topic, summary), task="title").strip()
+
+def _build_summary_prompt(summary: Optional[str], messages: List[Message], character: Character, topic: str) -> str:
+    """构建滚动摘要提示词"""
+    prompt = (
+        "You maintain a running summary of a conversation between a user and "
+        f"{character.name}. Update the summary with the new messages below. "
+        "Keep names, facts and open questions, stay under 150 words, and return ONLY the summary.\n\n"
+    )
     
-    # 调用AI生成标题
-    try:
-        response = call_qwen_model(prompt)
-        return response.strip()
-    except Exception as e:
-        print(f"生成标题失败: {str(e)}")
-        return f"与{character.name}的对话"  # 返回默认标题
-
-def get_dashscope_response(prompt: str) -> str:
-    """调用通义千问模型生成内容"""
-    return call_qwen_model(prompt)
\ No newline at end of file
+    if topic:
+        prompt += f"Topic: {topic}\n"
+    prompt += f"Current summary: {summary or '(empty)'}\n\nNew messages:\n"
+    prompt += "".join(render_message_line(msg.is_user, msg.content, character.name) for msg in messages)
+    return prompt
+
+def update_rolling_summary(summary: Optional[str], messages: List[Message], character: Character, topic: str) -> str:
+    """
+    将较早的消息合并进已有的滚动摘要
+
+    Raises:
+        LLMError: 模型调用失败
+    """
+    return call_qwen_model(_build_summary_prompt(summary, messages, character, topic), task="summary").strip()
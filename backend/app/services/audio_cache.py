@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class AudioCache:
+    """按内容寻址的语音文件缓存
+
+    文件名是 (文本, 语音, 语速, 音量) 的哈希，相同参数的请求直接复用已生成的文件。
+    超过保存时间的文件会被删除，总大小超过上限时从最早生成的文件开始淘汰。
+    清理需要扫描整个目录，写入新文件时最多每 cleanup_interval 秒扫描一次；
+    两次扫描之间累计估算总大小，超过上限时立即扫描。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age_hours: int, cleanup_interval: float = 60, extension: str = ".mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_hours * 3600
+        self.cleanup_interval = cleanup_interval
+        self.extension = extension
+        self._lock = threading.Lock()
+        # 上次扫描的时间（尚未扫描时为None）和此后估算的总大小
+        self._last_cleanup: Optional[float] = None
+        self._estimated_bytes = 0
+
+    @staticmethod
+    def key_for(text: str, voice: str, rate: str, volume: str, namespace: str = "") -> str:
+        """计算缓存键；namespace 用于区分不同合成服务的结果（为空时与旧的缓存键一致）"""
+        parts = [text, voice, rate, volume] + ([namespace] if namespace else [])
+        payload = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.extension)
+
+    def get(self, key: str) -> Optional[str]:
+        """返回未过期的缓存文件路径，不存在或已过期返回None"""
+        path = self.path_for(key)
+        try:
+            modified_at = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        if time.time() - modified_at > self.max_age_seconds:
+            self._remove(path)
+            return None
+        return path
+
+    def temp_path_for(self, key: str) -> str:
+        """生成写入中的临时文件路径，写完后通过 commit 原子替换为正式文件"""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.part")
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """把写完的临时文件放入缓存"""
+        path = self.path_for(key)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+        if self._cleanup_due(size):
+            self.enforce_limits()
+        return path
+
+    def _cleanup_due(self, added_bytes: int) -> bool:
+        """记录新写入的大小，判断是否需要扫描目录"""
+        with self._lock:
+            self._estimated_bytes += added_bytes
+            return (
+                self._last_cleanup is None
+                or time.monotonic() - self._last_cleanup >= self.cleanup_interval
+                or self._estimated_bytes > self.max_bytes
+            )
+
+    def discard(self, temp_path: str) -> None:
+        """丢弃未写完的临时文件"""
+        self._remove(temp_path)
+
+    def enforce_limits(self) -> None:
+        """删除过期文件，并把总大小控制在上限以内"""
+        with self._lock:
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+            except OSError:
+                return
+
+            now = time.time()
+            files = []
+            for entry in entries:
+                # 跳过正在写入的临时文件
+                if not entry.name.endswith(self.extension):
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime > self.max_age_seconds:
+                    self._remove(entry.path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+            self._last_cleanup = time.monotonic()
+            self._estimated_bytes = total
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除音频缓存文件失败 {path}: {str(e)}")
+
+# 创建全局语音缓存实例
+audio_cache = AudioCache(
+    directory=settings.AUDIO_FILES_DIR,
+    max_bytes=settings.AUDIO_CACHE_MAX_BYTES,
+    max_age_hours=settings.AUDIO_FILES_MAX_AGE,
+    cleanup_interval=settings.AUDIO_CACHE_CLEANUP_INTERVAL,
+)
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import create_access_token, decode_access_token
+from app.models.models import User
+
+class Principal(NamedTuple):
+    """已验证的用户身份"""
+    user_id: str
+    username: str
+    email: Optional[str]
+
+class PrincipalCache:
+    """已验证用户身份的进程内缓存，LRU淘汰
+
+    令牌验证本身不需要查询数据库，缓存进一步省去重复的签名校验和解析；
+    每条缓存带有过期时间（令牌的过期时间或固定的缓存时间）。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, key: str, principal: Principal, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (principal, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# 创建全局用户身份缓存实例
+principal_cache = PrincipalCache(max_entries=settings.AUTH_PRINCIPAL_CACHE_SIZE)
+
+def issue_access_token(user: User) -> str:
+    """为登录成功的用户签发访问令牌"""
+    return create_access_token({"sub": str(user.id), "name": user.username, "email": user.email})
+
+def resolve_token(token: str) -> Optional[Principal]:
+    """验证访问令牌并返回用户身份，无效或已过期时返回None（不查询数据库）"""
+    key = "token:" + token
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    claims = decode_access_token(token)
+    if claims is None or not isinstance(claims.get("sub"), str):
+        return None
+
+    principal = Principal(claims["sub"], claims.get("name") or "", claims.get("email"))
+    principal_cache.put(key, principal, claims["exp"])
+    return principal
+
+async def resolve_user_id(db: AsyncSession, user_id: str) -> Optional[Principal]:
+    """按用户ID解析用户身份（兼容没有令牌的旧客户端），用户不存在时返回None"""
+    key = "user:" + user_id
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    row = (await db.execute(
+        select(User.id, User.username, User.email).where(User.id == user_id)
+    )).first()
+    if row is None:
+        return None
+
+    principal = Principal(str(row.id), row.username, row.email)
+    principal_cache.put(key, principal, time.time() + settings.AUTH_PRINCIPAL_CACHE_TTL)
+    return principal
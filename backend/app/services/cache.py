@@ -0,0 +1,235 @@
+import asyncio
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+class CacheStats:
+    """缓存命中统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def record(self, field: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + count)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class CacheBackend(ABC):
+    """缓存后端接口，值统一为字符串"""
+
+    # 操作是否需要网络往返；为True时 ResponseCache 在线程中调用，不阻塞事件循环
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+class NullCacheBackend(CacheBackend):
+    """不缓存任何内容（关闭缓存时使用）"""
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内缓存，支持TTL和LRU淘汰"""
+
+    def __init__(self, max_entries: int, stats: Optional[CacheStats] = None):
+        self.max_entries = max_entries
+        self.stats = stats
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted and self.stats:
+            self.stats.record("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class RedisCacheBackend(CacheBackend):
+    """Redis（或兼容Redis协议的本地存储）缓存，过期与淘汰由服务端负责"""
+
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "app:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("使用 redis 缓存后端需要先安装 redis 包: pip install redis") from e
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self._client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+class ResponseCache:
+    """带命中统计的JSON值缓存（异步接口，需要网络往返的后端在线程中调用）"""
+
+    def __init__(self, backend: CacheBackend, stats: Optional[CacheStats] = None):
+        self.backend = backend
+        self.stats = stats or CacheStats()
+
+    async def _call(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._call(self.backend.get, key)
+        if raw is None:
+            self.stats.record("misses")
+            return None
+        self.stats.record("hits")
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        await self._call(self.backend.set, key, json.dumps(value, ensure_ascii=False), ttl)
+        self.stats.record("sets")
+
+    async def delete(self, key: str) -> None:
+        await self._call(self.backend.delete, key)
+
+def create_response_cache(backend: str, max_entries: int, redis_url: str, prefix: str) -> ResponseCache:
+    """
+    根据配置创建缓存
+
+    Args:
+        backend: memory / redis / none
+    """
+    stats = CacheStats()
+    if backend == "redis":
+        return ResponseCache(RedisCacheBackend(redis_url, prefix=prefix), stats)
+    if backend == "none":
+        return ResponseCache(NullCacheBackend(), stats)
+    return ResponseCache(MemoryCacheBackend(max_entries, stats), stats)
+
+# 加载失败时通知等待者自行重新加载
+_LOAD_FAILED = object()
+
+class ReadThroughCache:
+    """进程内读穿缓存：未命中时调用加载函数并按TTL缓存结果（值原样保存，不做序列化）
+
+    同一个键的并发未命中只加载一次；加载结果为None时不缓存。
+    加载期间如果调用了 invalidate，加载结果只返回给调用者而不写入缓存，避免写回旧数据。
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._backend = MemoryCacheBackend(max_entries, self.stats)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self._backend.get(key)
+        if value is not None:
+            self.stats.record("hits")
+            return value
+        self.stats.record("misses")
+
+        loading = self._loading.get(key)
+        if loading is not None:
+            value = await asyncio.shield(loading)
+            if value is not _LOAD_FAILED:
+                return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except BaseException:
+            future.set_result(_LOAD_FAILED)
+            raise
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+        if value is not None and generation == self._generation:
+            self._backend.set(key, value, self.ttl)
+            self.stats.record("sets")
+        future.set_result(value)
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        """删除指定的缓存"""
+        self._generation += 1
+        for key in keys:
+            self._backend.delete(key)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._backend.clear()
@@ -0,0 +1,119 @@
+from typing import NamedTuple, Optional, Tuple
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.api.http_cache import make_etag
+from app.core.config import settings
+from app.db.session import AsyncReadSessionLocal
+from app.models.models import Character, TopicCategory
+from app.schemas.character import CharacterWithTags
+from app.schemas.topic import TopicCategoryResponse, TopicResponse
+from app.services.cache import ReadThroughCache
+
+class CharacterProfile(NamedTuple):
+    """缓存中的角色信息（与数据库会话无关，可在请求之间共享）"""
+    id: str
+    name: str
+    description: str
+    avatar_url: Optional[str]
+    is_default: bool
+    tags: Tuple[str, ...]
+
+class CachedBody(NamedTuple):
+    """已序列化的响应体及其 ETag"""
+    content: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, value) -> "CachedBody":
+        content = orjson.dumps(value)
+        return cls(content, make_etag(content))
+
+# 创建全局角色与话题缓存实例
+catalog_cache = ReadThroughCache(ttl=settings.CATALOG_CACHE_TTL, max_entries=settings.CATALOG_CACHE_MAX_ENTRIES)
+
+DEFAULT_CHARACTERS_KEY = "characters:default"
+PREDEFINED_TOPICS_KEY = "topics:predefined"
+
+def _character_key(character_id: str) -> str:
+    return f"character:{character_id}"
+
+def _character_json_key(character_id: str) -> str:
+    return f"character-json:{character_id}"
+
+def _to_profile(character: Character) -> CharacterProfile:
+    return CharacterProfile(
+        id=str(character.id),
+        name=character.name,
+        description=character.description,
+        avatar_url=character.avatar_url,
+        is_default=bool(character.is_default),
+        tags=tuple(tag.tag for tag in character.tags),
+    )
+
+def _to_response(profile: CharacterProfile) -> CharacterWithTags:
+    return CharacterWithTags(
+        id=profile.id,
+        name=profile.name,
+        description=profile.description,
+        avatar=profile.avatar_url,
+        isDefault=profile.is_default,
+        tags=list(profile.tags),
+    )
+
+async def get_character_profile(character_id: str) -> Optional[CharacterProfile]:
+    """获取角色信息，不存在时返回None"""
+    async def load() -> Optional[CharacterProfile]:
+        async with AsyncReadSessionLocal() as db:
+            character = await db.get(Character, character_id, options=[selectinload(Character.tags)])
+            return _to_profile(character) if character else None
+
+    return await catalog_cache.get_or_load(_character_key(character_id), load)
+
+async def get_character_json(character_id: str) -> Optional[CachedBody]:
+    """获取序列化后的单个角色响应，不存在时返回None"""
+    async def load() -> Optional[CachedBody]:
+        profile = await get_character_profile(character_id)
+        return CachedBody.of(_to_response(profile).model_dump()) if profile else None
+
+    return await catalog_cache.get_or_load(_character_json_key(character_id), load)
+
+async def get_default_characters_json() -> CachedBody:
+    """获取序列化后的默认角色列表响应"""
+    async def load() -> CachedBody:
+        async with AsyncReadSessionLocal() as db:
+            characters = (await db.execute(
+                select(Character).options(selectinload(Character.tags)).where(Character.is_default == True)
+            )).scalars().all()
+            return CachedBody.of([_to_response(_to_profile(character)).model_dump() for character in characters])
+
+    return await catalog_cache.get_or_load(DEFAULT_CHARACTERS_KEY, load)
+
+async def get_predefined_topics_json() -> CachedBody:
+    """获取序列化后的预定义话题响应"""
+    async def load() -> CachedBody:
+        async with AsyncReadSessionLocal() as db:
+            # 所有分类的话题用一条 IN 查询一次性加载
+            categories = (await db.execute(
+                select(TopicCategory).options(selectinload(TopicCategory.topics))
+            )).scalars().all()
+            return CachedBody.of([
+                TopicCategoryResponse(
+                    id=category.id,
+                    name=category.name,
+                    topics=[TopicResponse(id=topic.id, title=topic.content) for topic in category.topics],
+                ).model_dump()
+                for category in categories
+            ])
+
+    return await catalog_cache.get_or_load(PREDEFINED_TOPICS_KEY, load)
+
+def invalidate_character(character_id: str) -> None:
+    """角色创建或修改后使相关缓存失效"""
+    catalog_cache.invalidate(_character_key(character_id), _character_json_key(character_id), DEFAULT_CHARACTERS_KEY)
+
+def invalidate_topics() -> None:
+    """预定义话题修改后使缓存失效"""
+    catalog_cache.invalidate(PREDEFINED_TOPICS_KEY)
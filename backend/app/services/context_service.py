@@ -0,0 +1,102 @@
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Conversation, Message, Character
+from app.services.prompt_cache import prompt_cache, RenderedHistory
+
+def recent_window_size() -> int:
+    """逐条保留在提示词中的最近消息数"""
+    return settings.CONTEXT_RECENT_TURNS * 2
+
+def max_context_messages() -> int:
+    """构建提示词时最多加载的消息数：最近窗口加上一次去抖间隔内可能尚未摘要的消息"""
+    return recent_window_size() + settings.TITLE_REGENERATE_EVERY_N_MESSAGES
+
+def _count_stmt(conversation_id: str):
+    return select(func.count(Message.id)).where(Message.conversation_id == conversation_id)
+
+def _last_message_id_stmt(conversation_id: str):
+    return select(Message.id).where(
+        Message.conversation_id == conversation_id
+    ).order_by(Message.timestamp.desc()).limit(1)
+
+async def message_list_version(db: AsyncSession, conversation_id: str) -> Tuple[int, object]:
+    """对话消息列表的版本（消息数和最后一条消息的时间），消息只追加不修改，版本不变即内容不变"""
+    row = (await db.execute(
+        select(func.count(Message.id), func.max(Message.timestamp)).where(Message.conversation_id == conversation_id)
+    )).one()
+    return row[0], row[1]
+
+def _context_limit(conversation: Conversation, total: int) -> int:
+    """尚未合并进摘要的消息数，最多 max_context_messages 条"""
+    unsummarized = total - (conversation.summarized_message_count or 0)
+    return min(unsummarized, max_context_messages())
+
+def _recent_messages_stmt(conversation_id: str, limit: int):
+    return select(Message).where(
+        Message.conversation_id == conversation_id
+    ).order_by(Message.timestamp.desc()).limit(limit)
+
+def load_context_messages(db: Session, conversation: Conversation) -> List[Message]:
+    """
+    加载构建提示词所需的消息（按时间升序）
+
+    只返回尚未合并进滚动摘要的消息，且最多为最近窗口加上一次去抖间隔的消息数，
+    因此无论对话多长，查询和提示词的大小都保持不变。
+    """
+    limit = _context_limit(conversation, db.execute(_count_stmt(conversation.id)).scalar_one())
+    if limit <= 0:
+        return []
+
+    messages = db.execute(_recent_messages_stmt(conversation.id, limit)).scalars().all()
+    return list(reversed(messages))
+
+async def load_context_messages_async(db: AsyncSession, conversation: Conversation) -> List[Message]:
+    """load_context_messages 的异步版本"""
+    limit = _context_limit(conversation, (await db.execute(_count_stmt(conversation.id))).scalar_one())
+    if limit <= 0:
+        return []
+
+    messages = (await db.execute(_recent_messages_stmt(conversation.id, limit))).scalars().all()
+    return list(reversed(messages))
+
+async def load_context_history(db: AsyncSession, conversation: Conversation, character: Character) -> RenderedHistory:
+    """
+    加载已渲染的上下文历史，优先使用提示词缓存
+
+    缓存命中时只需一次查询最新消息ID，不再加载和渲染历史消息。
+    """
+    summarized_count = conversation.summarized_message_count or 0
+    last_message_id = (await db.execute(_last_message_id_stmt(conversation.id))).scalar()
+
+    history = prompt_cache.get(conversation.id, last_message_id, summarized_count)
+    if history is None:
+        history = RenderedHistory.from_messages(await load_context_messages_async(db, conversation), character.name)
+        prompt_cache.put(conversation.id, character.name, summarized_count, history)
+    return history
+
+async def count_messages(db: AsyncSession, conversation_id: str) -> int:
+    """统计对话的消息数"""
+    return (await db.execute(_count_stmt(conversation_id))).scalar_one()
+
+def remember_new_messages(conversation_id: str, messages: Iterable[Message]) -> None:
+    """新消息提交后追加到提示词缓存，下次请求无需重新加载"""
+    prompt_cache.append(conversation_id, messages, max_context_messages())
+
+def load_messages_to_summarize(db: Session, conversation: Conversation) -> List[Message]:
+    """加载已滑出最近窗口、但还未合并进滚动摘要的消息（按时间升序）"""
+    total = db.execute(_count_stmt(conversation.id)).scalar_one()
+    summarized = conversation.summarized_message_count or 0
+    count = total - recent_window_size() - summarized
+    if count <= 0:
+        return []
+
+    return db.execute(
+        select(Message).where(
+            Message.conversation_id == conversation.id
+        ).order_by(Message.timestamp).offset(summarized).limit(count)
+    ).scalars().all()
@@ -0,0 +1,150 @@
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.models import Conversation, Character
+from app.services.ai_service import generate_conversation_title, update_rolling_summary
+from app.services.context_service import load_context_messages, load_messages_to_summarize
+from app.services.llm_gateway import LLMError
+from app.services.prompt_cache import prompt_cache
+
+logger = logging.getLogger(__name__)
+
+# 记录的对话数量上限，超出后淘汰最久未更新的对话
+MAX_TRACKED_CONVERSATIONS = 10000
+
+class ConversationMetaService:
+    """在后台线程中生成对话标题和摘要，不占用回复的关键路径
+
+    每个对话只有在距离上次生成新增了足够多的消息后才会重新生成（去抖），
+    生成结果直接写入数据库，前端在下次获取对话时即可拿到。
+    摘要是滚动更新的：每次只把滑出最近窗口的消息合并进已有摘要。
+    """
+
+    def __init__(self, regenerate_every: int, max_queue_size: int):
+        self.regenerate_every = regenerate_every
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue_size)
+        self._pending = set()
+        # 对话ID -> 上次触发生成时的消息数
+        self._generated_counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, conversation_id: str, message_count: int) -> bool:
+        """
+        登记对话的新消息数，满足去抖条件时加入后台生成队列
+
+        Returns:
+            bool: 是否加入了队列
+        """
+        if message_count < 2:
+            return False
+
+        with self._lock:
+            last_count = self._generated_counts.get(conversation_id)
+            if last_count is not None and message_count - last_count < self.regenerate_every:
+                return False
+            if conversation_id in self._pending:
+                return False
+
+            try:
+                self._queue.put_nowait(conversation_id)
+            except queue.Full:
+                logger.warning(f"标题生成队列已满，跳过对话 {conversation_id}")
+                return False
+
+            self._pending.add(conversation_id)
+            self._generated_counts[conversation_id] = message_count
+            self._generated_counts.move_to_end(conversation_id)
+            while len(self._generated_counts) > MAX_TRACKED_CONVERSATIONS:
+                self._generated_counts.popitem(last=False)
+
+            self._ensure_worker()
+        return True
+
+    def _ensure_worker(self) -> None:
+        """按需启动后台线程（调用方需持有锁）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="conversation-meta-worker", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            conversation_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(conversation_id)
+            try:
+                self._update_conversation(conversation_id)
+            except Exception as e:
+                logger.error(f"生成对话标题/摘要失败 ({conversation_id}): {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _update_conversation(self, conversation_id: str) -> None:
+        """生成并保存对话的标题和摘要"""
+        db = SessionLocal()
+        try:
+            conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+            if not conversation:
+                return
+
+            character = db.query(Character).filter(Character.id == conversation.character_id).first()
+            if not character:
+                return
+
+            # 对话对象只在内存中修改，最后统一用不触发onupdate的UPDATE写回
+            db.expunge(conversation)
+
+            # 先把滑出窗口的消息合并进滚动摘要
+            summary = conversation.summary
+            summarized_count = conversation.summarized_message_count or 0
+            to_summarize = load_messages_to_summarize(db, conversation)
+            if to_summarize:
+                try:
+                    summary = update_rolling_summary(summary, to_summarize, character, conversation.topic)
+                    summarized_count += len(to_summarize)
+                    conversation.summarized_message_count = summarized_count
+                except LLMError as e:
+                    # 保留原摘要，这些消息下次再合并
+                    logger.error(f"更新对话摘要失败 ({conversation_id}): {e}")
+                    to_summarize = []
+
+            messages = load_context_messages(db, conversation)
+            try:
+                title = generate_conversation_title(messages, character, conversation.topic, summary)
+            except LLMError as e:
+                logger.error(f"生成对话标题失败 ({conversation_id}): {e}")
+                title = conversation.title
+
+            # 把 updated_at 设为列的当前值：不触发onupdate，也不会用读取时的旧值覆盖期间新消息更新的时间
+            db.query(Conversation).filter(Conversation.id == conversation_id).update(
+                {
+                    Conversation.title: title,
+                    Conversation.summary: summary,
+                    Conversation.summarized_message_count: summarized_count,
+                    Conversation.updated_at: Conversation.updated_at,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+
+            # 摘要变化后已缓存的历史窗口不再有效
+            if to_summarize:
+                prompt_cache.invalidate(conversation_id)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+# 创建全局对话元信息服务实例
+conversation_meta_service = ConversationMetaService(
+    regenerate_every=settings.TITLE_REGENERATE_EVERY_N_MESSAGES,
+    max_queue_size=settings.TITLE_QUEUE_MAX_SIZE,
+)
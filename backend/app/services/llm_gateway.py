@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from app.core.config import settings
+from app.services.llm_providers import (
+    LLMError,
+    LLMProvider,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    classify_exception,
+    create_llm_provider,
+)
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """熔断器
+
+    连续 failure_threshold 次可重试的失败后熔断 recovery_timeout 秒，期间直接拒绝调用；
+    之后放行一个试探请求，成功则恢复，失败则继续熔断。
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._probe_started is not None else "open"
+
+    def allow(self) -> bool:
+        """是否允许本次调用"""
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if now - self._opened_at < self.recovery_timeout:
+                return False
+            # 同一时间只放行一个试探请求（试探请求异常中断时，超过冷却时间后再放行下一个）
+            if self._probe_started is not None and now - self._probe_started < self.recovery_timeout:
+                return False
+            self._probe_started = now
+            return True
+
+    def record(self, error: Optional[LLMError] = None) -> None:
+        """记录调用结果；不可重试的错误说明服务本身可用，按成功处理"""
+        with self._lock:
+            if error is None or not error.retryable:
+                if self._opened_at is not None:
+                    logger.info(f"模型 {self.name} 已恢复")
+                self._failures = 0
+                self._opened_at = None
+                self._probe_started = None
+                return
+
+            self._failures += 1
+            if self._probe_started is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.error(f"模型 {self.name} 连续失败 {self._failures} 次，熔断 {self.recovery_timeout} 秒")
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+    def release(self) -> None:
+        """调用被取消，结果未知：释放试探名额"""
+        with self._lock:
+            self._probe_started = None
+
+# 全局并发限制，在首次使用时创建
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """获取限制同时进行的模型调用数量的信号量"""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    return _llm_semaphore
+
+class LLMGateway:
+    """
+    模型调用网关
+
+    按 [请求的模型] + 备用模型 的顺序尝试：每个模型对可重试的错误按指数退避重试，
+    仍然失败或已熔断时改用下一个模型；有备用模型时，前面的模型使用较短的超时，
+    超时后不再重试而是直接降级。参数错误等不可重试的错误直接抛出。
+    所有模型都失败时抛出最后一个 LLMError，不返回任何替代文本。
+    实际的调用由 provider（通义千问或本地模拟服务）完成。
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        fallback_models: List[str],
+        primary_timeout: float,
+        timeout: float,
+        retry_attempts: int,
+        retry_backoff: float,
+        retry_backoff_max: float,
+        failure_threshold: int,
+        recovery_timeout: float,
+    ):
+        self.provider = provider
+        self.fallback_models = list(fallback_models)
+        self.primary_timeout = primary_timeout
+        self.timeout = timeout
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = CircuitBreaker(model, self.failure_threshold, self.recovery_timeout)
+                self._breakers[model] = breaker
+            return breaker
+
+    def _candidates(self, model: str) -> List[str]:
+        return [model] + [fallback for fallback in self.fallback_models if fallback != model]
+
+    def _timeout(self, is_last: bool, timeout: Optional[float]) -> float:
+        timeout = timeout if timeout is not None else self.timeout
+        return timeout if is_last else min(timeout, self.primary_timeout)
+
+    def _retry_options(self, is_last: bool) -> Dict[str, Any]:
+        def should_retry(error: BaseException) -> bool:
+            # 还有备用模型时，超时直接降级而不是继续等待同一个模型
+            if not isinstance(error, LLMError) or not error.retryable:
+                return False
+            return is_last or not isinstance(error, LLMTimeoutError)
+
+        return {
+            "stop": stop_after_attempt(max(1, self.retry_attempts)),
+            "wait": wait_exponential_jitter(initial=self.retry_backoff, max=self.retry_backoff_max),
+            "retry": retry_if_exception(should_retry),
+            "reraise": True,
+        }
+
+    def _check_breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise LLMUnavailableError(f"{model} 已熔断", model)
+        return breaker
+
+    def _next_model(self, candidates: List[str], index: int, error: LLMError) -> None:
+        """当前模型失败：不可降级的错误直接抛出，否则记录日志并尝试下一个模型"""
+        if index == len(candidates) - 1 or not (error.retryable or isinstance(error, LLMUnavailableError)):
+            raise error
+        logger.warning(f"{error}，改用 {candidates[index + 1]}")
+
+    def generate(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """同步生成（后台线程使用）"""
+        candidates = self._candidates(payload["model"])
+        for index, model in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            try:
+                for attempt in Retrying(**self._retry_options(is_last)):
+                    with attempt:
+                        return self._post(payload, model, self._timeout(is_last, timeout))
+            except LLMError as e:
+                self._next_model(candidates, index, e)
+
+    def _post(self, payload: Dict[str, Any], model: str, timeout: float) -> str:
+        breaker = self._check_breaker(model)
+        try:
+            content = self.provider.generate({**payload, "model": model}, timeout)
+        except LLMError as e:
+            breaker.record(e)
+            raise
+        except Exception as e:
+            error = classify_exception(e, model)
+            breaker.record(error)
+            raise error from e
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record()
+        return content
+
+    async def generate_async(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """异步生成"""
+        candidates = self._candidates(payload["model"])
+        for index, model in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            try:
+                async for attempt in AsyncRetrying(**self._retry_options(is_last)):
+                    with attempt:
+                        return await self._post_async(payload, model, self._timeout(is_last, timeout))
+            except LLMError as e:
+                self._next_model(candidates, index, e)
+
+    async def _post_async(self, payload: Dict[str, Any], model: str, timeout: float) -> str:
+        breaker = self._check_breaker(model)
+        try:
+            async with get_llm_semaphore():
+                content = await self.provider.generate_async({**payload, "model": model}, timeout)
+        except LLMError as e:
+            breaker.record(e)
+            raise
+        except Exception as e:
+            error = classify_exception(e, model)
+            breaker.record(error)
+            raise error from e
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record()
+        return content
+
+    async def stream_async(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        流式生成，逐段返回增量文本
+
+        重试和降级只发生在收到第一段文本之前；之后出错直接抛出 LLMError。
+        """
+        chunks, first_chunk = await self._open_stream(payload, timeout)
+        try:
+            if first_chunk:
+                yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def _open_stream(self, payload: Dict[str, Any], timeout: Optional[float]) -> Tuple[AsyncIterator[str], str]:
+        """建立流并取到第一段文本"""
+        candidates = self._candidates(payload["model"])
+        for index, model in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            try:
+                async for attempt in AsyncRetrying(**self._retry_options(is_last)):
+                    with attempt:
+                        chunks = self._stream_once(payload, model, self._timeout(is_last, timeout))
+                        try:
+                            return chunks, await chunks.__anext__()
+                        except StopAsyncIteration:
+                            return chunks, ""
+                        except BaseException:
+                            await chunks.aclose()
+                            raise
+            except LLMError as e:
+                self._next_model(candidates, index, e)
+
+    async def _stream_once(self, payload: Dict[str, Any], model: str, timeout: float) -> AsyncIterator[str]:
+        breaker = self._check_breaker(model)
+        try:
+            async with get_llm_semaphore():
+                async with aclosing(self.provider.stream_async({**payload, "model": model}, timeout)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+        except LLMError as e:
+            breaker.record(e)
+            raise
+        except Exception as e:
+            error = classify_exception(e, model)
+            breaker.record(error)
+            raise error from e
+        except BaseException:
+            # 客户端断开等情况，结果未知
+            breaker.release()
+            raise
+        breaker.record()
+
+    def snapshot(self) -> Dict[str, str]:
+        """各模型熔断器的状态"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.state for breaker in breakers}
+
+# 创建全局模型调用网关实例
+llm_gateway = LLMGateway(
+    provider=create_llm_provider(settings.LLM_PROVIDER),
+    fallback_models=settings.LLM_FALLBACK_MODELS,
+    primary_timeout=settings.LLM_PRIMARY_TIMEOUT,
+    timeout=settings.LLM_TIMEOUT,
+    retry_attempts=settings.LLM_RETRY_ATTEMPTS,
+    retry_backoff=settings.LLM_RETRY_BACKOFF,
+    retry_backoff_max=settings.LLM_RETRY_BACKOFF_MAX,
+    failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=settings.LLM_BREAKER_RECOVERY_SECONDS,
+)
+
+async def close_clients() -> None:
+    """关闭模型服务的HTTP客户端（应用关闭时调用）"""
+    await llm_gateway.provider.close()
@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from httpx_sse import aconnect_sse
+
+from app.core.config import settings
+
+# 通义千问 HTTP 接口地址
+GENERATION_PATH = "/services/aigc/text-generation/generation"
+
+class LLMError(Exception):
+    """模型调用失败；retryable 表示稍后重试可能成功"""
+    retryable = False
+
+    def __init__(self, message: str, model: Optional[str] = None):
+        super().__init__(message)
+        self.model = model
+
+class LLMTimeoutError(LLMError):
+    """调用超时"""
+    retryable = True
+
+class LLMRateLimitError(LLMError):
+    """被限流"""
+    retryable = True
+
+class LLMServerError(LLMError):
+    """服务端错误、连接失败或响应格式异常"""
+    retryable = True
+
+class LLMRequestError(LLMError):
+    """参数错误、鉴权失败、内容审核不通过等，重试也不会成功"""
+
+class LLMUnavailableError(LLMError):
+    """模型已熔断，直接失败"""
+
+def _error_data(text: str) -> Dict[str, Any]:
+    """从错误响应中取出 code/message（普通JSON或SSE的 data 行）"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    for line in text.splitlines():
+        if line.startswith("data:"):
+            try:
+                return json.loads(line[5:])
+            except ValueError:
+                break
+    return {}
+
+def classify_error_response(status_code: int, data: Dict[str, Any], model: str) -> LLMError:
+    """按状态码和错误码对失败的响应分类"""
+    code = str(data.get("code") or "")
+    message = f"{model} 返回 {status_code} {code}: {data.get('message')}"
+    if status_code == 429 or code.startswith("Throttling"):
+        return LLMRateLimitError(message, model)
+    if status_code >= 500 or code.startswith("Internal"):
+        return LLMServerError(message, model)
+    return LLMRequestError(message, model)
+
+def classify_exception(exc: Exception, model: str) -> LLMError:
+    """对调用过程中抛出的异常分类"""
+    if isinstance(exc, LLMError):
+        return exc
+    if isinstance(exc, httpx.TimeoutException):
+        return LLMTimeoutError(f"{model} 调用超时", model)
+    if isinstance(exc, httpx.TransportError):
+        return LLMServerError(f"{model} 连接失败: {exc!r}", model)
+    return LLMServerError(f"{model} 响应异常: {exc!r}", model)
+
+class LLMProvider(ABC):
+    """模型服务接口
+
+    请求体统一使用通义千问的格式（model / input.prompt / parameters），
+    返回生成的文本；失败时抛出 LLMError（其他异常由网关按 classify_exception 分类）。
+    重试、降级、熔断和并发限制由网关负责，服务实现只发起单次调用。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, payload: Dict[str, Any], timeout: float) -> str:
+        """同步生成（后台线程使用）"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def generate_async(self, payload: Dict[str, Any], timeout: float) -> str:
+        """异步生成"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_async(self, payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+        """流式生成，逐段返回增量文本"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """释放连接等资源（应用关闭时调用）"""
+
+class DashScopeProvider(LLMProvider):
+    """通义千问 HTTP 接口，同步和异步调用各使用一个共享的HTTP客户端（在首次使用时创建）"""
+
+    name = "dashscope"
+
+    def __init__(self):
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+
+    @staticmethod
+    def _client_options() -> Dict[str, Any]:
+        return {
+            "base_url": settings.DASHSCOPE_BASE_URL,
+            "headers": {"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
+            "timeout": httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+            "limits": httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        }
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        """获取共享的异步HTTP客户端（带连接池和超时配置）"""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(**self._client_options())
+        return self._async_client
+
+    def get_sync_client(self) -> httpx.Client:
+        """获取共享的同步HTTP客户端（后台线程使用，同样有超时，不会无限等待）"""
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(**self._client_options())
+        return self._sync_client
+
+    @staticmethod
+    def _parse_content(response: httpx.Response, model: str) -> str:
+        if response.status_code != 200:
+            raise classify_error_response(response.status_code, _error_data(response.text), model)
+        return response.json()["output"]["choices"][0]["message"]["content"]
+
+    def generate(self, payload: Dict[str, Any], timeout: float) -> str:
+        response = self.get_sync_client().post(GENERATION_PATH, json=payload, timeout=timeout)
+        return self._parse_content(response, payload["model"])
+
+    async def generate_async(self, payload: Dict[str, Any], timeout: float) -> str:
+        response = await self.get_async_client().post(GENERATION_PATH, json=payload, timeout=timeout)
+        return self._parse_content(response, payload["model"])
+
+    async def stream_async(self, payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+        model = payload["model"]
+        async with aconnect_sse(
+            self.get_async_client(),
+            "POST",
+            GENERATION_PATH,
+            json=payload,
+            headers={"X-DashScope-SSE": "enable"},
+            timeout=timeout,
+        ) as event_source:
+            if event_source.response.status_code != 200:
+                text = (await event_source.response.aread()).decode("utf-8", errors="replace")
+                raise classify_error_response(event_source.response.status_code, _error_data(text), model)
+            async for sse in event_source.aiter_sse():
+                data = sse.json()
+                if sse.event == "error" or "output" not in data:
+                    raise classify_error_response(500, data, model)
+                content = data["output"]["choices"][0]["message"]["content"]
+                if content:
+                    yield content
+
+    async def close(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+# 模拟输出使用的词表
+_MOCK_WORDS = (
+    "that sounds really interesting and I would love to hear more about it what did you enjoy most "
+    "when you were there was it easy to talk with people in English how do you usually practise "
+    "speaking every day maybe we could try describing it together step by step"
+).split()
+# 提示词中要求的数量和长度（例如 "generate 3 ..."、"max 15 words"、"under 150 words"）
+_MOCK_COUNT_PATTERN = re.compile(r"\bgenerate (\d+)\b", re.IGNORECASE)
+_MOCK_WORD_LIMIT_PATTERN = re.compile(r"\b(?:max|under) (\d+) words\b", re.IGNORECASE)
+
+class MockLLMProvider(LLMProvider):
+    """本地模拟的模型服务，用于离线压测，不访问网络
+
+    输出由提示词的哈希决定（相同请求得到相同输出），并符合应用提示词要求的格式：
+    JSON模式返回 {"reply", "options"} 对象，要求JSON数组的提示词返回对应条数的数组，其余返回英文文本。
+    每次调用先等待 latency 秒（首个token的延迟），再按 tokens_per_second 的速度输出，
+    总耗时超过超时时间时抛出 LLMTimeoutError；按 error_rate 的概率返回服务端错误。
+    错误注入使用固定种子的随机数，相同的调用顺序得到相同的结果。
+    """
+
+    name = "mock"
+
+    def __init__(self, latency: float, tokens_per_second: float, error_rate: float, output_tokens: int, seed: int):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _words(self, seed: str, count: int) -> List[str]:
+        digest = hashlib.sha256(seed.encode("utf-8")).digest()
+        return [_MOCK_WORDS[(digest[i % len(digest)] + i) % len(_MOCK_WORDS)] for i in range(count)]
+
+    def _sentence(self, seed: str, count: int) -> str:
+        words = self._words(seed, max(1, count))
+        return " ".join([words[0].capitalize()] + words[1:]) + "."
+
+    def render(self, payload: Dict[str, Any]) -> List[str]:
+        """生成模拟输出，按token切分（拼接后即完整输出）"""
+        prompt = payload["input"]["prompt"]
+        parameters = payload.get("parameters", {})
+        length = min(self.output_tokens, parameters.get("max_tokens") or self.output_tokens)
+        word_limit = _MOCK_WORD_LIMIT_PATTERN.search(prompt)
+        if word_limit:
+            length = min(length, int(word_limit.group(1)))
+
+        count_match = _MOCK_COUNT_PATTERN.search(prompt)
+        count = int(count_match.group(1)) if count_match else 3
+        if parameters.get("response_format", {}).get("type") == "json_object":
+            options = [self._sentence(f"{prompt}:option:{i}", 6)[:-1] + "?" for i in range(3)]
+            text = json.dumps({"reply": self._sentence(prompt, length), "options": options}, ensure_ascii=False)
+        elif "JSON array" in prompt:
+            text = json.dumps([self._sentence(f"{prompt}:item:{i}", 6)[:-1] for i in range(count)], ensure_ascii=False)
+        else:
+            text = self._sentence(prompt, length)
+        # 按空格切分为token，每段带上前面的空格
+        return re.findall(r"\s*\S+", text)
+
+    def _check(self, model: str, elapsed: float, timeout: float) -> None:
+        if elapsed > timeout:
+            raise LLMTimeoutError(f"{model} 调用超时", model)
+
+    def _duration(self, tokens: List[str]) -> float:
+        return self.latency + (len(tokens) / self.tokens_per_second if self.tokens_per_second > 0 else 0)
+
+    def generate(self, payload: Dict[str, Any], timeout: float) -> str:
+        model = payload["model"]
+        tokens = self.render(payload)
+        duration = self._duration(tokens)
+        time.sleep(min(duration, timeout))
+        self._check(model, duration, timeout)
+        if self._should_fail():
+            raise LLMServerError(f"{model} 返回 500 MockInternalError: 模拟的服务端错误", model)
+        return "".join(tokens)
+
+    async def generate_async(self, payload: Dict[str, Any], timeout: float) -> str:
+        model = payload["model"]
+        tokens = self.render(payload)
+        duration = self._duration(tokens)
+        await asyncio.sleep(min(duration, timeout))
+        self._check(model, duration, timeout)
+        if self._should_fail():
+            raise LLMServerError(f"{model} 返回 500 MockInternalError: 模拟的服务端错误", model)
+        return "".join(tokens)
+
+    async def stream_async(self, payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+        model = payload["model"]
+        await asyncio.sleep(min(self.latency, timeout))
+        self._check(model, self.latency, timeout)
+        if self._should_fail():
+            raise LLMServerError(f"{model} 返回 500 MockInternalError: 模拟的服务端错误", model)
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for token in self.render(payload):
+            yield token
+            if interval:
+                await asyncio.sleep(interval)
+
+def create_llm_provider(name: str) -> LLMProvider:
+    """
+    根据配置创建模型服务
+
+    Args:
+        name: dashscope / mock
+    """
+    if name == "mock":
+        return MockLLMProvider(
+            latency=settings.MOCK_LLM_LATENCY,
+            tokens_per_second=settings.MOCK_LLM_TOKENS_PER_SECOND,
+            error_rate=settings.MOCK_LLM_ERROR_RATE,
+            output_tokens=settings.MOCK_LLM_OUTPUT_TOKENS,
+            seed=settings.MOCK_SEED,
+        )
+    return DashScopeProvider()
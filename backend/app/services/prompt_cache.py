@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+from app.core.config import settings
+from app.services.ai_service import estimate_tokens, render_message_line
+
+class CachedMessage(NamedTuple):
+    """脱离数据库会话的消息快照，字段与 Message 模型一致"""
+    id: str
+    is_user: bool
+    content: str
+    timestamp: Optional[datetime]
+
+class RenderedHistory(list):
+    """
+    消息快照列表，同时携带每条消息已渲染好的提示词行及其token估算
+
+    可以直接作为 messages 参数传给 ai_service 中的函数，
+    format_messages_for_prompt 会复用 lines/tokens 而不是重新渲染。
+    """
+
+    def __init__(self, messages: Iterable[CachedMessage] = (), lines: Iterable[str] = (), tokens: Iterable[int] = ()):
+        super().__init__(messages)
+        self.lines: List[str] = list(lines)
+        self.tokens: List[int] = list(tokens)
+
+    @classmethod
+    def from_messages(cls, messages: Iterable, character_name: str) -> "RenderedHistory":
+        """从 Message 对象渲染"""
+        history = cls()
+        history.append_messages(messages, character_name)
+        return history
+
+    def append_messages(self, messages: Iterable, character_name: str) -> None:
+        """只渲染并追加新消息"""
+        for msg in messages:
+            line = render_message_line(msg.is_user, msg.content, character_name)
+            self.append(CachedMessage(str(msg.id), msg.is_user, msg.content, msg.timestamp))
+            self.lines.append(line)
+            self.tokens.append(estimate_tokens(line))
+
+    def extended(self, messages: Iterable, character_name: str) -> "RenderedHistory":
+        """返回追加了新消息的副本，不修改自身"""
+        history = RenderedHistory(self, self.lines, self.tokens)
+        history.append_messages(messages, character_name)
+        return history
+
+    def truncate(self, max_messages: int) -> None:
+        """只保留最近的 max_messages 条"""
+        overflow = len(self) - max_messages
+        if overflow > 0:
+            del self[:overflow]
+            del self.lines[:overflow]
+            del self.tokens[:overflow]
+
+    def matches_last_message(self, last_message_id: Optional[str]) -> bool:
+        """判断数据库中最新的消息是否就是缓存中的最后一条（同一时间戳的消息顺序不确定，都算命中）"""
+        if not self:
+            return last_message_id is None
+        last_timestamp = self[-1].timestamp
+        for msg in reversed(self):
+            if msg.timestamp != last_timestamp:
+                break
+            if msg.id == last_message_id:
+                return True
+        return False
+
+class _Entry(NamedTuple):
+    character_name: str
+    summarized_count: int
+    history: RenderedHistory
+
+class PromptCache:
+    """按对话缓存已渲染的历史消息窗口，LRU淘汰
+
+    以 (对话ID, 最后一条消息ID, 已摘要消息数) 判断缓存是否有效：
+    新消息通过 append 增量追加，摘要更新或写入失败时需调用 invalidate。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str, last_message_id: Optional[str], summarized_count: int) -> Optional[RenderedHistory]:
+        """获取仍然有效的缓存历史，返回副本"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            if entry.summarized_count != summarized_count or not entry.history.matches_last_message(last_message_id):
+                del self._entries[conversation_id]
+                return None
+            self._entries.move_to_end(conversation_id)
+            return RenderedHistory(entry.history, entry.history.lines, entry.history.tokens)
+
+    def put(self, conversation_id: str, character_name: str, summarized_count: int, history: RenderedHistory) -> None:
+        """写入对话的历史窗口"""
+        with self._lock:
+            self._entries[conversation_id] = _Entry(
+                character_name, summarized_count, RenderedHistory(history, history.lines, history.tokens)
+            )
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def append(self, conversation_id: str, messages: Iterable, max_messages: int) -> None:
+        """向已缓存的对话追加新消息（未缓存的对话忽略）"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            entry.history.append_messages(messages, entry.character_name)
+            entry.history.truncate(max_messages)
+
+    def invalidate(self, conversation_id: str) -> None:
+        """使对话的缓存失效"""
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# 创建全局提示词缓存实例
+prompt_cache = PromptCache(max_entries=settings.PROMPT_CACHE_MAX_CONVERSATIONS)
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+from app.core.config import settings
+
+class SlidingWindowRateLimiter:
+    """进程内的滑动窗口限流器
+
+    每个键在 window_seconds 内最多允许 max_events 次；
+    记录的键数超过 max_keys 时淘汰最久未访问的键，内存占用有上限。
+    """
+
+    def __init__(self, max_events: int, window_seconds: float, max_keys: int = 100000):
+        self.max_events = max_events
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> Optional[float]:
+        """
+        记录一次事件
+
+        Returns:
+            float: 超过限制时返回需要等待的秒数（本次不计数），否则返回None
+        """
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = deque()
+                self._events[key] = events
+            self._events.move_to_end(key)
+
+            while events and events[0] <= now - self.window_seconds:
+                events.popleft()
+
+            if len(events) >= self.max_events:
+                return events[0] + self.window_seconds - now
+
+            events.append(now)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+            return None
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._events.pop(key, None)
+
+# 创建全局登录限流实例
+login_user_limiter = SlidingWindowRateLimiter(
+    max_events=settings.LOGIN_RATE_LIMIT_PER_USER,
+    window_seconds=settings.LOGIN_RATE_LIMIT_WINDOW,
+)
+login_ip_limiter = SlidingWindowRateLimiter(
+    max_events=settings.LOGIN_RATE_LIMIT_PER_IP,
+    window_seconds=settings.LOGIN_RATE_LIMIT_WINDOW,
+)
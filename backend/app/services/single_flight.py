@@ -0,0 +1,83 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，其余调用者等待并共享结果（或异常）
+
+    线程（do）和协程（do_async）使用相同的键时同样会合并；
+    只合并进行中的调用，调用结束后不保留结果（缓存由调用方负责）。
+    不要在事件循环线程中调用 do，否则可能等待同一循环中的协程而死锁。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[concurrent.futures.Future, bool]:
+        """返回该键进行中的调用，以及当前调用者是否需要负责执行"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: str, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """在当前线程中执行 fn，相同键的并发调用等待同一结果"""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future)
+            future.set_exception(e)
+            raise
+        self._finish(key, future)
+        future.set_result(result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行协程函数 fn，相同键的并发调用等待同一结果
+
+        调用在独立的任务中执行，发起调用的请求被取消时不影响其他等待者。
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._complete(key, future, done))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _complete(self, key: str, future: concurrent.futures.Future, task: asyncio.Task) -> None:
+        self._finish(key, future)
+        if task.cancelled():
+            future.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """合并统计：executed 为实际执行次数，coalesced 为等待已有调用的次数"""
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "inFlight": len(self._calls),
+            }
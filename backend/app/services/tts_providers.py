@@ -0,0 +1,101 @@
+import asyncio
+import random
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+import edge_tts
+
+from app.core.config import settings
+
+class TTSProvider(ABC):
+    """语音合成服务接口：流式返回 mp3 数据块，失败时抛出异常"""
+
+    name = "base"
+    # 音频缓存键的命名空间，避免不同服务的合成结果互相命中
+    cache_namespace = ""
+
+    @abstractmethod
+    def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+class EdgeTTSProvider(TTSProvider):
+    """微软 edge-tts（需要访问网络）"""
+
+    name = "edge"
+
+    async def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+# 静音的 mp3 帧：MPEG-2 Layer III、24kHz、48kbps、单声道（与 edge-tts 默认输出格式一致），
+# 每帧 144 字节、24 毫秒，帧头之后全为0（主数据长度为0，解码为静音）
+_SILENT_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC0]) + bytes(140)
+_FRAME_SECONDS = 0.024
+# 每个数据块包含的帧数（约 1.2 秒音频）
+_FRAMES_PER_CHUNK = 50
+# 正常语速下每秒朗读的字符数，用于估算音频时长
+_CHARS_PER_SECOND = 14.0
+_RATE_PATTERN = re.compile(r"^([+-]\d+)%$")
+
+class MockTTSProvider(TTSProvider):
+    """本地模拟的语音合成服务，用于离线压测，不访问网络
+
+    返回可以正常播放的静音 mp3，时长按文本长度和语速估算（相同参数得到相同的音频）。
+    先等待 latency 秒，再按 bytes_per_second 的速度返回数据块；
+    按 error_rate 的概率合成失败，错误注入使用固定种子的随机数。
+    """
+
+    name = "mock"
+    cache_namespace = "mock"
+
+    def __init__(self, latency: float, bytes_per_second: int, error_rate: float, seed: int):
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    @staticmethod
+    def frame_count(text: str, rate: str) -> int:
+        """按文本长度和语速（例如 "+20%"）估算帧数"""
+        match = _RATE_PATTERN.match(rate.strip())
+        speed = max(0.1, 1 + int(match.group(1)) / 100) if match else 1.0
+        seconds = len(text) / (_CHARS_PER_SECOND * speed)
+        return max(1, int(seconds / _FRAME_SECONDS))
+
+    async def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        await asyncio.sleep(self.latency)
+        if self._should_fail():
+            raise RuntimeError("模拟的语音合成失败")
+        remaining = self.frame_count(text, rate)
+        while remaining > 0:
+            frames = min(remaining, _FRAMES_PER_CHUNK)
+            remaining -= frames
+            chunk = _SILENT_FRAME * frames
+            yield chunk
+            if self.bytes_per_second > 0:
+                await asyncio.sleep(len(chunk) / self.bytes_per_second)
+
+def create_tts_provider(name: str) -> TTSProvider:
+    """
+    根据配置创建语音合成服务
+
+    Args:
+        name: edge / mock
+    """
+    if name == "mock":
+        return MockTTSProvider(
+            latency=settings.MOCK_TTS_LATENCY,
+            bytes_per_second=settings.MOCK_TTS_BYTES_PER_SECOND,
+            error_rate=settings.MOCK_TTS_ERROR_RATE,
+            seed=settings.MOCK_SEED,
+        )
+    return EdgeTTSProvider()
@@ -1,65 +1,201 @@
-import edge_tts
 import asyncio
-import os
-from typing import Optional
+import logging
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.services.audio_cache import AudioCache, audio_cache
+from app.services.tts_providers import TTSProvider, create_tts_provider
+
+logger = logging.getLogger(__name__)
+
+# 默认使用中文女声
+DEFAULT_VOICE = "zh-CN-XiaoxiaoNeural"
+# 语速 (默认 +0%)
+DEFAULT_RATE = "+0%"
+# 音量 (默认 +0%)
+DEFAULT_VOLUME = "+0%"
+
+# 从缓存文件读取音频时每次返回的大小
+FILE_CHUNK_SIZE = 64 * 1024
 
 class TTSService:
-    def __init__(self):
-        # 默认使用中文女声
-        self.voice = "zh-CN-XiaoxiaoNeural"
-        # 语速 (默认 +0%)
-        self.rate = "+0%"
-        # 音量 (默认 +0%)
-        self.volume = "+0%"
-    
-    async def text_to_speech_async(self, text: str, output_file: str) -> Optional[str]:
+    """语音合成服务
+
+    语音参数随每次调用传入，服务本身不保存可变的语音状态，并发请求互不影响。
+    合成在服务器的事件循环中异步进行，同时进行的合成数量受信号量限制；
+    参数完全相同且正在合成的请求会等待同一次合成的结果，而不是重复合成。
+    实际的合成由 provider（edge-tts 或本地模拟服务）完成。
+    """
+
+    def __init__(self, cache: AudioCache, max_concurrency: int, provider: TTSProvider):
+        self.cache = cache
+        self.provider = provider
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 缓存键 -> 正在进行的合成任务，完成后结果为缓存文件路径（失败时为合成的异常）
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def cached_file(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, volume: str = DEFAULT_VOLUME) -> Optional[str]:
+        """返回已缓存的语音文件路径（查询文件状态在线程中进行）"""
+        return await asyncio.to_thread(self.cache.get, self.cache.key_for(text, voice, rate, volume, self.provider.cache_namespace))
+
+    async def synthesize(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, volume: str = DEFAULT_VOLUME) -> Optional[str]:
+        """
+        生成语音文件并放入缓存（已缓存则直接返回）
+
+        Returns:
+            str: 缓存中的音频文件路径，如果失败则返回None
+        """
+        async for _ in self.stream(text, voice, rate, volume):
+            pass
+        return await self.cached_file(text, voice, rate, volume)
+
+    async def stream(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, volume: str = DEFAULT_VOLUME) -> AsyncIterator[bytes]:
+        """
+        流式返回语音数据（mp3），边合成边返回并写入缓存
+
+        已缓存或有相同的合成正在进行时，等待其完成后从缓存文件读取。
+        合成在独立的任务中进行，发起合成的客户端断开时合成继续完成，不影响等待同一结果的其他请求。
+        """
+        key = self.cache.key_for(text, voice, rate, volume, self.provider.cache_namespace)
+
+        # 相同的合成正在进行时直接等待其结果；否则在线程中查询缓存文件，等待期间开始的合成同样复用
+        inflight = self._inflight.get(key)
+        path = None if inflight is not None else await asyncio.to_thread(self.cache.get, key)
+        if path is None:
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                path = await asyncio.shield(inflight)
+
+        if path is not None:
+            async for chunk in self._read_file(path):
+                yield chunk
+            return
+
+        # 合成任务把数据块放入队列，None 表示结束；本请求断开后数据块留在队列中随任务结束释放
+        chunks: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self._synthesize_to_cache(key, text, voice, rate, volume, chunks))
+        self._inflight[key] = task
+        # 没有人等待结果时也取出异常，避免 "exception was never retrieved" 警告（错误已记录日志）
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        # 合成失败时抛出同样的异常
+        await asyncio.shield(task)
+
+    async def _synthesize_to_cache(self, key: str, text: str, voice: str, rate: str, volume: str, chunks: asyncio.Queue) -> str:
         """
-        将文本转换为语音文件（异步方法）
-        
-        Args:
-            text: 要转换的文本
-            output_file: 输出的音频文件路径
-            
+        调用语音合成服务，边把数据块放入队列边写入临时文件，完成后放入缓存
+
         Returns:
-            str: 生成的音频文件路径，如果失败则返回None
+            str: 缓存中的音频文件路径
         """
+        temp_path = None
+        path = None
         try:
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
-            # 创建通信对象
-            communicate = edge_tts.Communicate(
-                text, 
-                self.voice,
-                rate=self.rate,
-                volume=self.volume
-            )
-            
-            # 生成语音文件
-            await communicate.save(output_file)
-            return output_file
-            
+            temp_path = await asyncio.to_thread(self.cache.temp_path_for, key)
+            async with self._semaphore:
+                f = await asyncio.to_thread(open, temp_path, "wb")
+                try:
+                    async for chunk in self.provider.stream(text, voice, rate, volume):
+                        await asyncio.to_thread(f.write, chunk)
+                        chunks.put_nowait(chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+            path = await asyncio.to_thread(self.cache.commit, key, temp_path)
+            return path
         except Exception as e:
-            print(f"TTS转换失败: {str(e)}")
-            return None
-    
-    def text_to_speech(self, text: str, output_file: str) -> Optional[str]:
+            logger.error(f"TTS转换失败: {str(e)}")
+            raise
+        finally:
+            if path is None and temp_path is not None:
+                await asyncio.to_thread(self.cache.discard, temp_path)
+            self._inflight.pop(key, None)
+            chunks.put_nowait(None)
+
+    @staticmethod
+    async def _read_file(path: str) -> AsyncIterator[bytes]:
+        """分块读取缓存文件（文件读写在线程中进行，不阻塞事件循环）"""
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+class TTSPrefetcher:
+    """在后台为新的AI回复预先合成语音，用户点击播放时直接命中缓存
+
+    任务放入有界队列，由固定数量的后台任务处理；队列满时直接丢弃新任务，
+    避免聊天高峰时预合成占满服务器资源（用户点击播放时仍会正常合成）。
+    """
+
+    def __init__(self, service: TTSService, queue_size: int, workers: int):
+        self.service = service
+        self.queue_size = queue_size
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self) -> None:
+        """启动后台任务（应用启动时调用）"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """停止后台任务（应用关闭时调用）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, volume: str = DEFAULT_VOLUME) -> bool:
         """
-        将文本转换为语音文件（同步方法）
+        提交预合成任务（需在事件循环中调用）
+
+        Returns:
+            bool: 是否加入了队列；未启动或队列已满时返回False
         """
-        return asyncio.run(self.text_to_speech_async(text, output_file))
-    
-    def set_voice(self, voice: str):
-        """设置语音（例如：zh-CN-XiaoxiaoNeural, en-US-JennyNeural）"""
-        self.voice = voice
-    
-    def set_rate(self, rate: str):
-        """设置语速（例如：+50%，-50%）"""
-        self.rate = rate
-    
-    def set_volume(self, volume: str):
-        """设置音量（例如：+50%，-50%）"""
-        self.volume = volume
+        if self._queue is None or not text:
+            return False
+        try:
+            self._queue.put_nowait((text, voice, rate, volume))
+            return True
+        except asyncio.QueueFull:
+            logger.info("TTS预合成队列已满，跳过本条消息")
+            return False
+
+    async def _worker(self) -> None:
+        while True:
+            text, voice, rate, volume = await self._queue.get()
+            try:
+                if await self.service.cached_file(text, voice, rate, volume) is None:
+                    await self.service.synthesize(text, voice, rate, volume)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"TTS预合成失败: {str(e)}")
+            finally:
+                self._queue.task_done()
 
 # 创建全局TTS服务实例
-tts_service = TTSService() 
\ No newline at end of file
+tts_service = TTSService(
+    audio_cache,
+    max_concurrency=settings.TTS_MAX_CONCURRENCY,
+    provider=create_tts_provider(settings.TTS_PROVIDER),
+)
+
+# 创建全局TTS预合成实例
+tts_prefetcher = TTSPrefetcher(
+    tts_service,
+    queue_size=settings.TTS_PRESYNTHESIZE_QUEUE_SIZE,
+    workers=settings.TTS_PRESYNTHESIZE_WORKERS,
+)
@@ -1,14 +1,17 @@
 import uvicorn
 from app.db.init_db import init_db
+from app.db.migrations import upgrade_database
 from app.db.session import SessionLocal, engine
-from app.db.base_class import Base
 
 def init():
-    Base.metadata.create_all(bind=engine)
+    """初始化数据库：执行迁移并写入初始数据（均已是最新时直接跳过）"""
+    upgrade_database(engine)
 
-    """初始化数据库"""
     db = SessionLocal()
-    init_db(db)
+    try:
+        init_db(db)
+    finally:
+        db.close()
 
 
 if __name__ == "__main__":
@@ -16,4 +19,4 @@ if __name__ == "__main__":
     init()
     
     # 启动服务器
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,192 @@
+"""
+模型路由基准测试：用线上相同的提示词，对比各任务在不同模型上的延迟、输出长度和输出质量
+
+用法（在 backend 目录下运行，需要配置 DASHSCOPE_API_KEY；LLM_PROVIDER=mock 时使用本地模拟服务）:
+    python -m scripts.benchmark_llm_routes
+    python -m scripts.benchmark_llm_routes --tasks title options --models qwen-turbo qwen-plus qwen-max
+    python -m scripts.benchmark_llm_routes --repeat 10 --show-samples
+
+每个任务默认对比路由表（LLM_ROUTES）中配置的模型和首选模型 LLM_MODEL；
+请求直接发给指定模型，不经过重试和降级，失败会计入失败率；输出token数按 estimate_tokens 估算。
+质量检查只做格式层面的判断（能否解析、条数、长度、是否全英文），最终请结合 --show-samples 人工比较。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ai_service import (
+    _build_generation_payload,
+    _build_options_prompt,
+    _build_reply_with_options_prompt,
+    _build_response_prompt,
+    _build_summary_prompt,
+    _build_title_prompt,
+    _build_topics_prompt,
+    _parse_options,
+    _parse_reply_with_options,
+    _parse_topics,
+    estimate_tokens,
+)
+from app.services.llm_gateway import close_clients, llm_gateway
+
+TASKS = ["reply", "options", "topics", "title", "summary"]
+
+CHARACTER = SimpleNamespace(
+    name="Emma",
+    description="a friendly English teacher from London who loves travelling and cooking",
+)
+TOPIC = "Travel experiences"
+MESSAGES = [
+    SimpleNamespace(id=f"bench-{i}", is_user=is_user, content=content)
+    for i, (is_user, content) in enumerate([
+        (False, "Hi! I'm Emma. Have you travelled anywhere interesting recently?"),
+        (True, "Yes, I went to Japan last spring. The cherry blossoms were amazing."),
+        (False, "Oh, how lovely! Which cities did you visit while you were there?"),
+        (True, "Tokyo and Kyoto. I liked Kyoto more because it was quieter."),
+        (False, "Kyoto is beautiful. Did you try any traditional food there?"),
+        (True, "I tried kaiseki for the first time, but I don't know how to describe it in English."),
+    ])
+]
+TOPICS_PROMPT = "daily life in a big city"
+NUM_TOPICS = 5
+
+def _is_english(text: str) -> bool:
+    return sum(1 for ch in text if ord(ch) > 127) <= len(text) * 0.02
+
+def _check_reply(output: str) -> Tuple[bool, str]:
+    if settings.AI_COMBINED_OPTIONS_ENABLED:
+        reply, options = _parse_reply_with_options(output)
+        if reply is None:
+            return False, "取不到回复"
+        if not options or len(options) != 3:
+            return False, "推荐问题不是3个"
+    else:
+        reply = output.strip()
+    if not reply or not _is_english(reply):
+        return False, "回复为空或不是英文"
+    if "language model" in reply.lower() or " an ai" in reply.lower():
+        return False, "提到了AI身份"
+    return True, ""
+
+def _check_options(output: str) -> Tuple[bool, str]:
+    options = _parse_options(output)
+    if not options or len(options) != 3:
+        return False, "不能解析为3个问题"
+    return True, ""
+
+def _check_topics(output: str) -> Tuple[bool, str]:
+    topics = _parse_topics(output, NUM_TOPICS)
+    if not topics or len(topics) != NUM_TOPICS:
+        return False, f"不能解析为{NUM_TOPICS}个话题"
+    return True, ""
+
+def _check_title(output: str) -> Tuple[bool, str]:
+    title = output.strip()
+    if not title or "\n" in title:
+        return False, "为空或多行"
+    if len(title.split()) > 15:
+        return False, "超过15个词"
+    return True, ""
+
+def _check_summary(output: str) -> Tuple[bool, str]:
+    summary = output.strip()
+    if not summary:
+        return False, "为空"
+    if len(summary.split()) > 150:
+        return False, "超过150个词"
+    return True, ""
+
+def build_cases() -> Dict[str, Tuple[str, bool, Callable[[str], Tuple[bool, str]]]]:
+    """任务 -> (提示词, 是否JSON模式, 质量检查)，提示词与线上一致"""
+    if settings.AI_COMBINED_OPTIONS_ENABLED:
+        reply_prompt, reply_json = _build_reply_with_options_prompt(MESSAGES, CHARACTER, TOPIC), True
+    else:
+        reply_prompt, reply_json = _build_response_prompt(MESSAGES, CHARACTER, TOPIC), False
+    return {
+        "reply": (reply_prompt, reply_json, _check_reply),
+        "options": (_build_options_prompt(MESSAGES, CHARACTER, TOPIC), False, _check_options),
+        "topics": (_build_topics_prompt(TOPICS_PROMPT, NUM_TOPICS), False, _check_topics),
+        "title": (_build_title_prompt(MESSAGES, CHARACTER, TOPIC), False, _check_title),
+        "summary": (_build_summary_prompt(None, MESSAGES, CHARACTER, TOPIC), False, _check_summary),
+    }
+
+async def run_once(payload: dict, timeout: Optional[float]) -> Tuple[float, Optional[str], int, str]:
+    """调用一次，返回 (耗时ms, 输出, 输出token数, 错误)"""
+    start = time.perf_counter()
+    try:
+        output = await llm_gateway.provider.generate_async(payload, timeout or settings.LLM_TIMEOUT)
+        return (time.perf_counter() - start) * 1000, output, estimate_tokens(output), ""
+    except Exception as e:
+        return (time.perf_counter() - start) * 1000, None, 0, repr(e)
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+async def benchmark(tasks: List[str], extra_models: List[str], repeat: int, show_samples: bool) -> None:
+    cases = build_cases()
+    rows = []
+    for task in tasks:
+        prompt, json_mode, check = cases[task]
+        route = settings.llm_route(task)
+        models = list(dict.fromkeys([route.model or settings.LLM_MODEL, settings.LLM_MODEL] + extra_models))
+        for model in models:
+            payload = {**_build_generation_payload(prompt, task, json_mode=json_mode), "model": model}
+            latencies, tokens, passed, notes, sample = [], [], 0, [], None
+            for _ in range(repeat):
+                elapsed, output, output_tokens, error = await run_once(payload, route.timeout)
+                latencies.append(elapsed)
+                if output is None:
+                    notes.append(error)
+                    continue
+                tokens.append(output_tokens)
+                ok, note = check(output)
+                passed += ok
+                if note:
+                    notes.append(note)
+                sample = sample or output
+
+            routed = "*" if model == (route.model or settings.LLM_MODEL) else " "
+            rows.append((task, f"{routed}{model}", passed, repeat, latencies, tokens, notes))
+            print(
+                f"[{task}] {routed}{model}: 通过 {passed}/{repeat}, "
+                f"p50 {statistics.median(latencies):.0f} ms, p95 {_percentile(latencies, 0.95):.0f} ms, "
+                f"平均输出 {statistics.mean(tokens) if tokens else 0:.0f} tokens"
+                + (f"，问题: {sorted(set(notes))}" if notes else "")
+            )
+            if show_samples and sample:
+                print("    " + sample.strip().replace("\n", "\n    ")[:600])
+
+    print("\n===== 汇总（* 为当前路由的模型） =====")
+    print(f"{'任务':<8}{'模型':<16}{'通过率':>8}{'p50 ms':>10}{'p95 ms':>10}{'输出tokens':>12}")
+    for task, model, passed, total, latencies, tokens, _ in rows:
+        print(
+            f"{task:<8}{model:<16}{passed / total:>8.0%}{statistics.median(latencies):>10.0f}"
+            f"{_percentile(latencies, 0.95):>10.0f}{(statistics.mean(tokens) if tokens else 0):>12.0f}"
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比各任务在不同模型上的延迟、输出长度和输出质量")
+    parser.add_argument("--tasks", nargs="+", choices=TASKS, default=TASKS, help="要测试的任务")
+    parser.add_argument("--models", nargs="*", default=[], help="额外对比的模型，例如 qwen-plus qwen-max")
+    parser.add_argument("--repeat", type=int, default=5, help="每个任务、每个模型的调用次数")
+    parser.add_argument("--show-samples", action="store_true", help="打印每个模型的一条输出，便于人工比较质量")
+    args = parser.parse_args()
+
+    if settings.LLM_PROVIDER == "dashscope" and not settings.DASHSCOPE_API_KEY:
+        parser.error("需要先配置 DASHSCOPE_API_KEY")
+
+    async def run() -> None:
+        try:
+            await benchmark(args.tasks, args.models, args.repeat, args.show_samples)
+        finally:
+            await close_clients()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
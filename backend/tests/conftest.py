@@ -0,0 +1,72 @@
+"""
+测试环境：临时 SQLite 数据库 + 本地模拟的模型和语音合成服务，不访问网络
+
+在 backend 目录下运行: python -m pytest
+"""
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import select
+
+# 配置在导入 app 时读取，必须在导入之前设置
+_TEST_DIR = tempfile.mkdtemp(prefix="app-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ["AUDIO_FILES_DIR"] = os.path.join(_TEST_DIR, "audio")
+os.environ["LLM_PROVIDER"] = "mock"
+os.environ["TTS_PROVIDER"] = "mock"
+os.environ["MOCK_LLM_LATENCY"] = "0"
+os.environ["MOCK_LLM_TOKENS_PER_SECOND"] = "0"
+os.environ["MOCK_TTS_LATENCY"] = "0"
+os.environ["MOCK_TTS_BYTES_PER_SECOND"] = "0"
+os.environ["AI_CACHE_BACKEND"] = "memory"
+
+from fastapi.testclient import TestClient
+
+from app.db.init_db import init_db
+from app.db.session import SessionLocal
+from app.main import app
+from app.models.models import Character, Conversation, generate_uuid
+
+DEMO_USERNAME = "demo"
+DEMO_PASSWORD = "demo123"
+
+@pytest.fixture(scope="session")
+def client():
+    """启动应用（启动时执行数据库迁移）并写入初始数据"""
+    with TestClient(app) as test_client:
+        db = SessionLocal()
+        try:
+            init_db(db)
+        finally:
+            db.close()
+        yield test_client
+
+@pytest.fixture(scope="session")
+def demo_user(client):
+    """示例用户的ID和认证头"""
+    response = client.post("/api/auth/login", data={"username": DEMO_USERNAME, "password": DEMO_PASSWORD})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    return {
+        "id": data["user"]["id"],
+        "headers": {"Authorization": f"Bearer {data['access_token']}"},
+    }
+
+@pytest.fixture
+def empty_conversation(demo_user) -> str:
+    """没有消息的新对话（消息少于标题重新生成的间隔，后台任务不会修改它）"""
+    db = SessionLocal()
+    try:
+        conversation = Conversation(
+            id=generate_uuid(),
+            character_id=db.execute(select(Character.id).limit(1)).scalar(),
+            user_id=demo_user["id"],
+            title="empty",
+            topic="testing",
+        )
+        db.add(conversation)
+        db.commit()
+        return conversation.id
+    finally:
+        db.close()
@@ -0,0 +1,63 @@
+"""流式回复：模型调用失败时与 /response 一样不保存本轮的任何消息"""
+import json
+
+from app.api.api_v1.endpoints import ai
+from app.db.session import SessionLocal
+from app.models.models import Message
+from app.services.llm_providers import LLMServerError
+
+def _events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def _message_count(client, conversation_id):
+    return len(client.get(f"/api/conversations/{conversation_id}/messages").json())
+
+def test_stream_saves_both_messages(client, empty_conversation):
+    response = client.post("/api/ai/response/stream", json={"conversation_id": empty_conversation, "message": "Hello!"})
+    assert response.status_code == 200
+    assert _events(response.text)[-1][0] == "done"
+    assert _message_count(client, empty_conversation) == 2
+
+def test_stream_llm_error_discards_user_message(client, empty_conversation, monkeypatch):
+    async def failing_stream(*args, **kwargs):
+        yield "Hel"
+        raise LLMServerError("模拟的服务端错误", "mock")
+
+    monkeypatch.setattr(ai, "get_ai_response_stream", failing_stream)
+    response = client.post("/api/ai/response/stream", json={"conversation_id": empty_conversation, "message": "Hello!"})
+    assert response.status_code == 200
+    event, data = _events(response.text)[-1]
+    assert event == "error"
+    assert data["retryable"] is True
+    assert _message_count(client, empty_conversation) == 0
+
+    # 重试时上下文中没有失败的那条用户消息
+    monkeypatch.undo()
+    response = client.post("/api/ai/response/stream", json={"conversation_id": empty_conversation, "message": "Hello again!"})
+    assert _events(response.text)[-1][0] == "done"
+    messages = client.get(f"/api/conversations/{empty_conversation}/messages").json()
+    assert [message["content"] for message in messages if message["isUser"]] == ["Hello again!"]
+
+def test_stream_writes_nothing_until_reply_is_complete(client, empty_conversation, monkeypatch):
+    """客户端在流式输出期间断开时，对话中不会留下没有回复的用户消息"""
+    counts_during_stream = []
+
+    async def observed_stream(*args, **kwargs):
+        yield "Hel"
+        db = SessionLocal()
+        try:
+            counts_during_stream.append(db.query(Message).filter(Message.conversation_id == empty_conversation).count())
+        finally:
+            db.close()
+        yield "lo."
+
+    monkeypatch.setattr(ai, "get_ai_response_stream", observed_stream)
+    response = client.post("/api/ai/response/stream", json={"conversation_id": empty_conversation, "message": "Hello!"})
+    assert _events(response.text)[-1][0] == "done"
+    assert counts_during_stream == [0]
+    messages = client.get(f"/api/conversations/{empty_conversation}/messages").json()
+    assert [(message["isUser"], message["content"]) for message in messages] == [(True, "Hello!"), (False, "Hello.")]
@@ -0,0 +1,43 @@
+"""语音文件缓存：写入新文件时按间隔清理目录，估算总大小超过上限时立即清理"""
+import os
+import time
+
+import pytest
+
+from app.services import audio_cache as audio_cache_module
+from app.services.audio_cache import AudioCache
+
+@pytest.fixture
+def scans(monkeypatch):
+    """记录扫描目录的次数"""
+    calls = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        calls.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(audio_cache_module.os, "scandir", counting_scandir)
+    return calls
+
+def _put(cache, key, size, age=0):
+    temp_path = cache.temp_path_for(key)
+    with open(temp_path, "wb") as f:
+        f.write(b"\0" * size)
+    # 写入时间按 age 秒前设置，确定淘汰顺序
+    modified_at = time.time() - age
+    os.utime(temp_path, (modified_at, modified_at))
+    return cache.commit(key, temp_path)
+
+def test_commit_scans_at_most_once_per_interval(tmp_path, scans):
+    cache = AudioCache(str(tmp_path), max_bytes=10_000, max_age_hours=1, cleanup_interval=3600)
+    for i in range(5):
+        _put(cache, f"key{i}", 100)
+    assert len(scans) == 1
+
+def test_commit_scans_when_estimate_exceeds_limit(tmp_path, scans):
+    cache = AudioCache(str(tmp_path), max_bytes=250, max_age_hours=1, cleanup_interval=3600)
+    paths = [_put(cache, f"key{i}", 100, age=10 - i) for i in range(3)]
+    assert len(scans) == 2
+    # 超出上限时淘汰最早的文件
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
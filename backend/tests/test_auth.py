@@ -0,0 +1,27 @@
+"""默认只接受令牌：没有令牌时不能通过 user_id 参数或路径访问用户数据"""
+from app.api.api_v1.endpoints import users
+
+def test_path_user_requires_token(client, demo_user):
+    url = f"/api/conversations/user/{demo_user['id']}"
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=demo_user["headers"]).status_code == 200
+
+def test_user_id_param_requires_token(client, demo_user):
+    assert client.get("/api/favorites/list", params={"user_id": demo_user["id"]}).status_code == 401
+    assert client.get("/api/favorites/list", headers=demo_user["headers"]).status_code == 200
+
+def test_path_user_must_match_token(client, demo_user):
+    response = client.get("/api/conversations/user/someone-else", headers=demo_user["headers"])
+    assert response.status_code == 403
+
+def test_unknown_username_still_verifies_a_hash(client, monkeypatch):
+    """用户不存在时同样执行一次密码验证，响应时间不暴露用户名是否已注册"""
+    calls = []
+
+    async def dummy_verify():
+        calls.append(True)
+
+    monkeypatch.setattr(users, "dummy_verify_password_async", dummy_verify)
+    response = client.post("/api/auth/login", data={"username": "no-such-user", "password": "secret"})
+    assert response.status_code == 401
+    assert calls == [True]
@@ -0,0 +1,41 @@
+"""结果缓存：需要网络往返的后端不在事件循环线程中调用"""
+import asyncio
+import threading
+
+from app.services.cache import MemoryCacheBackend, ResponseCache
+
+class RecordingBackend(MemoryCacheBackend):
+    """记录每次调用所在线程的内存后端"""
+
+    def __init__(self, blocking: bool):
+        super().__init__(max_entries=10)
+        self.blocking = blocking
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl)
+
+def _round_trip(backend):
+    async def run():
+        cache = ResponseCache(backend)
+        await cache.set("key", ["a", "b"], 60)
+        return await cache.get("key"), threading.get_ident()
+    return asyncio.run(run())
+
+def test_blocking_backend_runs_in_thread():
+    backend = RecordingBackend(blocking=True)
+    value, loop_thread = _round_trip(backend)
+    assert value == ["a", "b"]
+    assert len(backend.threads) == 2
+    assert loop_thread not in backend.threads
+
+def test_memory_backend_runs_inline():
+    backend = RecordingBackend(blocking=False)
+    value, loop_thread = _round_trip(backend)
+    assert value == ["a", "b"]
+    assert backend.threads == [loop_thread, loop_thread]
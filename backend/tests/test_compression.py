@@ -0,0 +1,28 @@
+"""条件请求与压缩：304 响应的 ETag 与客户端缓存的200响应一致"""
+import pytest
+
+from app.core.config import settings
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_not_modified_keeps_uncompressed_etag(client, empty_conversation, encoding):
+    # 空的消息列表小于压缩阈值，原样返回
+    url = f"/api/conversations/{empty_conversation}/messages"
+    response = client.get(url, headers={"Accept-Encoding": encoding})
+    assert "content-encoding" not in response.headers
+    etag = response.headers["etag"]
+
+    response = client.get(url, headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_not_modified_keeps_compressed_etag(client, encoding):
+    response = client.get("/api/characters/default", headers={"Accept-Encoding": encoding})
+    assert len(response.content) >= settings.RESPONSE_COMPRESSION_MIN_SIZE
+    assert response.headers["content-encoding"] == encoding
+    etag = response.headers["etag"]
+    assert etag.endswith(f'-{encoding}"')
+
+    response = client.get("/api/characters/default", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
@@ -0,0 +1,47 @@
+"""调用模型期间不持有数据库写锁：不同对话的请求并发执行，而不是排队等待 SQLite 的写锁"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+
+from app.db.session import SessionLocal
+from app.models.models import Character
+from app.services.llm_gateway import llm_gateway
+
+LATENCY = 0.5
+REQUESTS = 4
+
+@pytest.fixture
+def slow_llm(monkeypatch):
+    monkeypatch.setattr(llm_gateway.provider, "latency", LATENCY)
+
+def _run_concurrently(call):
+    started = time.monotonic()
+    with ThreadPoolExecutor(REQUESTS) as pool:
+        responses = list(pool.map(call, range(REQUESTS)))
+    return responses, time.monotonic() - started
+
+def test_concurrent_requests_do_not_serialize(client, demo_user, slow_llm):
+    db = SessionLocal()
+    try:
+        character_id = db.execute(select(Character.id).limit(1)).scalar()
+    finally:
+        db.close()
+
+    # 话题和消息各不相同，不会命中结果缓存或合并为同一次模型调用
+    responses, elapsed = _run_concurrently(lambda i: client.post(
+        "/api/conversations/",
+        json={"character_id": character_id, "topic": f"concurrency {i}"},
+        headers=demo_user["headers"],
+    ))
+    assert [response.status_code for response in responses] == [200] * REQUESTS
+    assert elapsed < LATENCY * 3
+
+    conversation_ids = [response.json()["id"] for response in responses]
+    responses, elapsed = _run_concurrently(lambda i: client.post(
+        "/api/ai/response",
+        json={"conversation_id": conversation_ids[i], "message": f"question {i}"},
+    ))
+    assert [response.status_code for response in responses] == [200] * REQUESTS
+    assert elapsed < LATENCY * 3
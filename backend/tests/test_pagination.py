@@ -0,0 +1,95 @@
+"""键集分页：同一时间戳的多行在两个方向上逐页遍历，每行恰好出现一次且顺序与不分页时一致"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app.db.session import SessionLocal
+from app.models.models import Character, Conversation, Message, generate_uuid
+
+PAGE_SIZE = 2
+SHARED_TIMESTAMP = datetime(2024, 1, 1, 12, 0, 0)
+
+def _ids(response):
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()]
+
+def _walk(client, url, headers, response, direction):
+    """
+    从 response 这一页开始，沿 before（X-Prev-Cursor）或 after（X-Next-Cursor）翻到头
+
+    返回按列表顺序排列的全部ID，以及最后取到的一页
+    """
+    header = "X-Prev-Cursor" if direction == "before" else "X-Next-Cursor"
+    pages = [_ids(response)]
+    while header in response.headers:
+        assert len(pages) < 50, "分页没有结束"
+        response = client.get(url, params={"limit": PAGE_SIZE, direction: response.headers[header]}, headers=headers)
+        pages.append(_ids(response))
+    if direction == "before":
+        pages.reverse()
+    return [item_id for page in pages for item_id in page], response
+
+@pytest.fixture(params=["shared", "default"])
+def same_second_conversation(request, client, demo_user):
+    """
+    包含7条消息的对话
+
+    shared: 消息和对话更新时间都是同一个时间戳；
+    default: 在同一个事务中按列的默认值写入（旧版本中这些行的时间相同且存储格式与游标不同）
+    """
+    timestamp = SHARED_TIMESTAMP if request.param == "shared" else None
+    db = SessionLocal()
+    try:
+        character_id = db.execute(select(Character.id).limit(1)).scalar()
+        conversation = Conversation(
+            id=generate_uuid(),
+            character_id=character_id,
+            user_id=demo_user["id"],
+            title="same second",
+            topic="paging",
+            updated_at=timestamp,
+        )
+        db.add(conversation)
+        db.add_all(
+            Message(conversation_id=conversation.id, content=f"message {i}", is_user=i % 2 == 0, timestamp=timestamp)
+            for i in range(7)
+        )
+        db.commit()
+        return conversation.id
+    finally:
+        db.close()
+
+def test_messages_walk_both_directions(client, same_second_conversation):
+    url = f"/api/conversations/{same_second_conversation}/messages"
+    expected = _ids(client.get(url))
+    assert len(expected) == 7
+
+    # 不带游标时返回最新的一页，向前翻到最早的一页，再向后翻回最新
+    latest = client.get(url, params={"limit": PAGE_SIZE})
+    backward, earliest = _walk(client, url, None, latest, "before")
+    assert backward == expected
+    forward, _ = _walk(client, url, None, earliest, "after")
+    assert forward == expected
+
+def test_conversations_walk_both_directions(client, demo_user, same_second_conversation):
+    url = f"/api/conversations/user/{demo_user['id']}"
+    headers = demo_user["headers"]
+    expected = _ids(client.get(url, headers=headers))
+    assert same_second_conversation in expected
+
+    first = client.get(url, params={"limit": PAGE_SIZE}, headers=headers)
+    forward, last = _walk(client, url, headers, first, "after")
+    assert forward == expected
+    backward, _ = _walk(client, url, headers, last, "before")
+    assert backward == expected
+
+def test_reply_follows_user_message(client, same_second_conversation):
+    """同一请求中先后保存的用户消息和AI回复保持写入顺序"""
+    for i in range(3):
+        response = client.post("/api/ai/response", json={"conversation_id": same_second_conversation, "message": f"question {i}"})
+        assert response.status_code == 200, response.text
+
+    messages = client.get(f"/api/conversations/{same_second_conversation}/messages").json()[7:]
+    assert [message["isUser"] for message in messages] == [True, False] * 3
+    assert [message["content"] for message in messages[::2]] == [f"question {i}" for i in range(3)]
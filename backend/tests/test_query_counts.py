@@ -0,0 +1,62 @@
+"""
+各接口执行的SQL条数上限，防止 N+1 查询回归
+
+上限取当前的实际条数；修改接口后条数增加时，先确认不是按数据行数增长的查询，再调整这里的上限。
+"""
+from app.db.query_counter import count_queries
+from app.services.catalog_service import catalog_cache
+
+def test_user_conversations(client, demo_user):
+    # 对话和角色在同一条查询中加载，与对话数量无关
+    with count_queries() as counter:
+        response = client.get(f"/api/conversations/user/{demo_user['id']}", headers=demo_user["headers"])
+    assert response.status_code == 200
+    assert len(response.json()) > 1
+    counter.assert_at_most(1)
+
+def test_user_conversations_page(client, demo_user):
+    with count_queries() as counter:
+        response = client.get(f"/api/conversations/user/{demo_user['id']}?limit=2", headers=demo_user["headers"])
+    assert response.status_code == 200
+    counter.assert_at_most(1)
+
+def test_default_characters(client):
+    catalog_cache.clear()
+    # 未命中缓存：角色一条查询，标签一条 IN 查询
+    with count_queries() as counter:
+        response = client.get("/api/characters/default")
+    assert response.status_code == 200
+    counter.assert_at_most(2)
+
+    # 命中缓存：不查询数据库
+    with count_queries() as counter:
+        client.get("/api/characters/default")
+    counter.assert_at_most(0)
+
+def test_predefined_topics(client):
+    catalog_cache.clear()
+    # 未命中缓存：分类一条查询，话题一条 IN 查询
+    with count_queries() as counter:
+        response = client.get("/api/topics/")
+    assert response.status_code == 200
+    counter.assert_at_most(2)
+
+    with count_queries() as counter:
+        client.get("/api/topics/")
+    counter.assert_at_most(0)
+
+def test_ai_response(client, empty_conversation):
+    conversation_id = empty_conversation
+    catalog_cache.clear()
+
+    # 角色和提示词缓存都未命中
+    with count_queries() as counter:
+        response = client.post("/api/ai/response", json={"conversation_id": conversation_id, "message": "Hello!"})
+    assert response.status_code == 200, response.text
+    counter.assert_at_most(12)
+
+    # 角色和已渲染的历史消息都来自缓存
+    with count_queries() as counter:
+        response = client.post("/api/ai/response", json={"conversation_id": conversation_id, "message": "Tell me more."})
+    assert response.status_code == 200, response.text
+    counter.assert_at_most(8)
@@ -6,7 +6,7 @@ import {
     type ReactNode,
 } from "react";
 import type { User } from "../types/index";
-import apiClient from "../services/api"; // 从新文件中导入
+import apiClient, { ACCESS_TOKEN_KEY, UNAUTHORIZED_EVENT } from "../services/api"; // 从新文件中导入
 import { loginUser, getMe } from "../services/authService";
 
 // --- 类型定义 ---
@@ -39,7 +39,10 @@ export function AuthProvider({ children }: AuthProviderProps) {
 
             // TODO测试时，无论怎样，都加载测试用户
             // setUser(await getMe());
-            if (id && username) {
+            // 旧版本登录后没有保存访问令牌，后端已不再接受只带用户ID的请求，需要重新登录
+            if (id && username && !localStorage.getItem(ACCESS_TOKEN_KEY)) {
+                logout();
+            } else if (id && username) {
                 try {
                     setUser({ id, username });
                     // TODO测试用
@@ -57,6 +60,13 @@ export function AuthProvider({ children }: AuthProviderProps) {
         checkAuthStatus();
     }, []); // 空依赖数组确保此 effect 只在组件挂载时运行一次
 
+    // 任意请求返回 401（令牌失效）时登出，PrivateRoute 随即跳转到登录页
+    useEffect(() => {
+        const handleUnauthorized = () => logout();
+        window.addEventListener(UNAUTHORIZED_EVENT, handleUnauthorized);
+        return () => window.removeEventListener(UNAUTHORIZED_EVENT, handleUnauthorized);
+    }, []);
+
     // --- 核心改动：实现真实的登录函数 ---
     const login = async (username1: string, password: string) => {
         // setIsLoading(true);
@@ -83,6 +93,7 @@ export function AuthProvider({ children }: AuthProviderProps) {
         // 移除 token 而不是 user 对象
         localStorage.removeItem("id");
         localStorage.removeItem("username");
+        localStorage.removeItem(ACCESS_TOKEN_KEY);
     };
 
     const value = {
@@ -1,6 +1,6 @@
 import { use } from "react";
 import type { Message } from "../types";
-import apiClient from "./api";
+import apiClient, { authHeaders, notifyUnauthorized } from "./api";
 import { useAuth } from "../contexts/AuthContext";
 
 export const fetchAiOptions = async (
@@ -90,6 +90,77 @@ export async function getAiResponse(
     };
 }
 
+// 流式获取AI回复接口 (SSE)
+// onDelta 每收到一段增量文本调用一次，流结束后返回完整的消息
+export async function getAiResponseStream(
+    userInput: string,
+    conversationId: string,
+    onDelta: (delta: string) => void
+): Promise<{ message: Message; conversationTitle?: string }> {
+    const response = await fetch(
+        `${apiClient.defaults.baseURL}/api/ai/response/stream`,
+        {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+                ...authHeaders(),
+            },
+            body: JSON.stringify({
+                conversation_id: conversationId,
+                message: userInput,
+            }),
+        }
+    );
+    if (response.status === 401) {
+        notifyUnauthorized();
+    }
+    if (!response.ok || !response.body) {
+        throw new Error("AI流式回复请求失败");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE 事件之间以空行分隔
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            boundary = buffer.indexOf("\n\n");
+
+            let event = "message";
+            let data = "";
+            for (const line of rawEvent.split("\n")) {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            const payload = JSON.parse(data);
+            if (event === "delta") {
+                onDelta(payload.content);
+            } else if (event === "done") {
+                return {
+                    message: {
+                        id: payload.id,
+                        conversationId: conversationId,
+                        content: payload.content,
+                        isUser: payload.isUser,
+                        timestamp: payload.timestamp,
+                    },
+                    conversationTitle: payload.conversationTitle,
+                };
+            } else if (event === "error") {
+                throw new Error(payload.detail);
+            }
+        }
+    }
+    throw new Error("AI流式回复意外中断");
+}
+
 // 创建新对话， 然后让ai生成第一条回复。 再返回对话id
 //TODO 这个有点难，再看看改不改
 
@@ -6,19 +6,43 @@ const apiClient = axios.create({
     baseURL: API_URL,
 });
 
-// 你甚至可以在这里添加拦截器，统一处理 token 失效等情况
-// apiClient.interceptors.response.use(
-//     (response) => response,
-//     (error) => {
-//         if (error.response && error.response.status === 401) {
-//             // 在这里可以触发全局的登出逻辑
-//             // 例如： window.location.href = '/login';
-//             // 或者使用事件总线通知 AuthContext
-//             console.error("Unauthorized! Logging out.");
-//             localStorage.removeItem("accessToken");
-//         }
-//         return Promise.reject(error);
-//     }
-// );
+// 登录后保存的访问令牌
+export const ACCESS_TOKEN_KEY = "accessToken";
+
+// 带上访问令牌的请求头（用于不经过 apiClient 的 fetch 请求）
+export const authHeaders = (): Record<string, string> => {
+    const token = localStorage.getItem(ACCESS_TOKEN_KEY);
+    return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
+// 每个请求自动携带访问令牌
+apiClient.interceptors.request.use((config) => {
+    const token = localStorage.getItem(ACCESS_TOKEN_KEY);
+    if (token) {
+        config.headers.Authorization = `Bearer ${token}`;
+    }
+    return config;
+});
+
+// 未登录或令牌失效时通知 AuthContext 登出（由它清理本地状态并回到登录页）
+export const UNAUTHORIZED_EVENT = "auth:unauthorized";
+
+export const notifyUnauthorized = () => {
+    window.dispatchEvent(new Event(UNAUTHORIZED_EVENT));
+};
+
+// 统一处理 401：没有令牌的旧登录状态或令牌已过期；登录接口本身的 401 是用户名或密码错误，不在这里处理
+apiClient.interceptors.response.use(
+    (response) => response,
+    (error) => {
+        if (
+            error.response?.status === 401 &&
+            !error.config?.url?.includes("/api/auth/login")
+        ) {
+            notifyUnauthorized();
+        }
+        return Promise.reject(error);
+    }
+);
 
 export default apiClient;
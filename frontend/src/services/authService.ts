@@ -1,4 +1,4 @@
-import apiClient from "./api";
+import apiClient, { ACCESS_TOKEN_KEY } from "./api";
 import type { User } from "../types"; // 如果需要，可以导入类型
 
 // 封装注册用户的函数
@@ -32,9 +32,12 @@ export const loginUser = async (
         },
     });
     // shit-like
-    const { user:userGetFromBackend } = response.data;
+    const { user:userGetFromBackend, access_token } = response.data;
     console.log(response.data);
 
+    // 保存访问令牌，之后的请求由 apiClient 自动携带
+    localStorage.setItem(ACCESS_TOKEN_KEY, access_token);
+
     const user: User = {
         id: userGetFromBackend.id,
         username:userGetFromBackend.username,